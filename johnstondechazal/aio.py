@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.aio
+
+Asyncio interface to the ground truth computation.  The blocking file I/O and
+the CPU bound elimination are run in executors so the event loop remains
+responsive, and concurrent identical requests share a single computation::
+
+    agt = AsyncGroundTruth(FindGrouthTruth(download=False))
+    landmarks, meta = await agt.load_landmarks_image('i001qa-mn.jpg')
+    history = await agt.converge_select(landmarks[:, :, 0], meta)
+    history = await agt.converge_image('i001qa-mn.jpg', 37)
+
+"""
+__author__ = 'Ben Johnston'
+
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Hashable, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.cache import result_key
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.history import History
+from johnstondechazal.method import find_worst_partition
+
+
+class AsyncGroundTruth:
+    """Asynchronous wrapper of
+    :class:`~johnstondechazal.groundtruth.FindGrouthTruth`"""
+    def __init__(self,
+                 gt: FindGrouthTruth,
+                 io_executor: Union[Executor, None] = None,
+                 cpu_executor: Union[Executor, None] = None):
+        """Constructor
+
+        :param gt: The ground truth finder
+        :type gt: FindGrouthTruth
+        :param io_executor: The executor used to load the landmarks, defaults
+            to `None` for the default executor of the event loop
+        :type io_executor: Union[Executor, None], optional
+        :param cpu_executor: The executor used to compute the ground truth,
+            defaults to `None` for the default executor of the event loop
+        :type cpu_executor: Union[Executor, None], optional
+        """
+        self.gt = gt
+        self.io_executor = io_executor
+        self.cpu_executor = cpu_executor
+        self._inflight = {}
+
+    async def _run(self, key: Union[Hashable, None],
+                   executor: Union[Executor, None], func: Callable) -> Any:
+        """Run a function in an executor, awaiting the running call with the
+        same key instead of starting another
+
+        :param key: The key of the call, `None` to never share the call
+        :type key: Union[Hashable, None]
+        :param executor: The executor to run the function in
+        :type executor: Union[Executor, None]
+        :param func: The function
+        :type func: Callable
+        :return: The result of the function
+        :rtype: Any
+        """
+        loop = asyncio.get_running_loop()
+
+        if key is None:
+            return await loop.run_in_executor(executor, func)
+
+        key = (id(loop), key)
+        future = self._inflight.get(key)
+
+        if future is None:
+            future = loop.run_in_executor(executor, func)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Cancelling one caller must not cancel the call shared with others
+        return await asyncio.shield(future)
+
+    async def load_landmarks_image(
+        self,
+        image: str,
+        type: Union[str, None] = None,
+        landmarks: Union[Sequence[int], None] = None
+    ) -> Tuple[np.ndarray, pd.DataFrame]:
+        """Load all landmarks and meta-data for an image, see
+        :meth:`FindGrouthTruth.load_landmarks_image
+        <johnstondechazal.groundtruth.FindGrouthTruth.load_landmarks_image>`
+
+        :param image: The selected image
+        :type image: str
+        :param type: The type of annotator selected, defaults to `None`
+        :type type: Union[str, None], optional
+        :param landmarks: The landmark IDs to load, defaults to `None` for all
+            landmarks
+        :type landmarks: Union[Sequence[int], None], optional
+        :return: The facial landmark information and meta data
+        :rtype: Tuple[np.ndarray, pd.DataFrame]
+        """
+        if landmarks is not None:
+            landmarks = tuple(landmarks)
+
+        key = ('load_landmarks_image', image, type, landmarks)
+        return await self._run(
+            key, self.io_executor,
+            partial(self.gt.load_landmarks_image, image, type, landmarks))
+
+    async def converge_select(self,
+                              landmarks: np.ndarray,
+                              meta: pd.DataFrame,
+                              select_func: Callable = find_worst_partition,
+                              **kwargs) -> History:
+        """Converge the mean for a landmark set, see
+        :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select`
+
+        :param landmarks: The landmark set
+        :type landmarks: np.ndarray
+        :param meta: The metadata
+        :type meta: pd.DataFrame
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :return: The history information of the process
+        :rtype: History
+
+        Additional keyword arguments are passed to
+        :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select`.
+        """
+        # Hashing the landmarks would block the event loop
+        key = await asyncio.get_running_loop().run_in_executor(
+            self.cpu_executor,
+            partial(result_key, landmarks, meta, select_func, **kwargs))
+        if key is not None:
+            key = ('converge_select', key)
+
+        return await self._run(
+            key, self.cpu_executor,
+            partial(self.gt.converge_select,
+                    landmarks,
+                    meta,
+                    select_func=select_func,
+                    **kwargs))
+
+    async def converge_image(self,
+                             image: str,
+                             landmark: int,
+                             type: Union[str, None] = None,
+                             select_func: Callable = find_worst_partition,
+                             **kwargs) -> History:
+        """Compute the ground truth of a landmark of an image, loading the
+        landmark and computing the elimination in the executors, see
+        :meth:`FindGrouthTruth.converge_image
+        <johnstondechazal.groundtruth.FindGrouthTruth.converge_image>`
+
+        :param image: The selected image
+        :type image: str
+        :param landmark: The landmark ID
+        :type landmark: int
+        :param type: The type of annotator selected, defaults to `None`
+        :type type: Union[str, None], optional
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :raises ValueError: If the image does not have the landmark
+        :return: The history information of the process
+        :rtype: History
+
+        Additional keyword arguments are passed to
+        :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select`.
+        """
+        landmarks, meta = await self.load_landmarks_image(
+            image, type, [landmark])
+
+        if not landmarks.shape[2]:
+            raise ValueError(f'Unknown landmark {landmark!r}')
+
+        return await self.converge_select(landmarks[:, :, 0],
+                                          meta,
+                                          select_func=select_func,
+                                          **kwargs)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.cache
+
+Content addressed cache of ground truth results.  Results are keyed on the
+hash of the landmarks and meta data and the parameters of the elimination.
+
+"""
+__author__ = 'Ben Johnston'
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.history import History
+
+
+def function_key(func: Callable) -> str:
+    """A name identifying a function and any bound arguments
+
+    :param func: The function
+    :type func: Callable
+    :return: The name of the function
+    :rtype: str
+    """
+
+    if isinstance(func, partial):
+        args = [repr(x) for x in func.args]
+        args += [
+            f'{key}={val!r}' for key, val in sorted(func.keywords.items())
+        ]
+        return f'{function_key(func.func)}({", ".join(args)})'
+
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def params_key(**params) -> Union[str, None]:
+    """A name identifying the parameters of a computation
+
+    :return: The parameters as JSON, `None` if a function parameter cannot be
+        identified, e.g. a lambda
+    :rtype: Union[str, None]
+
+    Keyword arguments are the parameters of the computation.
+    """
+
+    for name, val in params.items():
+        if callable(val):
+            val = function_key(val)
+
+            # Lambdas and nested functions are not identified by their name
+            if '<' in val:
+                return None
+        elif val is not None and not isinstance(val, (int, float, str)):
+            val = str(val)
+
+        params[name] = val
+
+    return json.dumps(params, sort_keys=True)
+
+
+def result_key(landmarks: np.ndarray, meta: pd.DataFrame,
+               select_func: Callable, **params) -> Union[str, None]:
+    """Compute the key of a ground truth result
+
+    :param landmarks: The landmark set
+    :type landmarks: np.ndarray
+    :param meta: The metadata
+    :type meta: pd.DataFrame
+    :param select_func: The function used to select the annotators
+    :type select_func: Callable
+    :return: The key of the result, `None` if the result cannot be cached
+        because a function parameter cannot be identified, e.g. a lambda
+    :rtype: Union[str, None]
+
+    Additional keyword arguments are the parameters of the computation.
+    """
+
+    params = params_key(**params, select_func=select_func)
+    if params is None:
+        return None
+
+    landmarks = np.ascontiguousarray(landmarks)
+
+    digest = hashlib.sha256()
+    digest.update(f'{landmarks.dtype.str}{landmarks.shape}'.encode())
+    digest.update(landmarks.data)
+    digest.update(pd.util.hash_pandas_object(meta).values.tobytes())
+    digest.update(str(list(meta.columns)).encode())
+    digest.update(params.encode())
+
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Least recently used cache of ground truth results held in memory with
+    an optional directory of pickled results shared between runs.  The cached
+    histories are shared between callers and must not be modified."""
+    def __init__(self, maxsize: int = 128, cache_dir: Union[str, None] = None):
+        """Constructor
+
+        :param maxsize: The maximum number of results held in memory,
+            defaults to 128
+        :type maxsize: int, optional
+        :param cache_dir: The directory to store the results in, defaults to
+            `None` to only cache results in memory
+        :type cache_dir: Union[str, None], optional
+        """
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    key = staticmethod(result_key)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key: str) -> Union[History, None]:
+        """Get a result from the cache
+
+        :param key: The key of the result
+        :type key: str
+        :return: The result or `None` if not cached
+        :rtype: Union[History, None]
+        """
+        with self._lock:
+            history = self._results.get(key)
+
+            if history is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return history
+
+        if (self.cache_dir is not None) and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                history = pickle.load(f)
+
+            self._remember(key, history)
+            with self._lock:
+                self.hits += 1
+            return history
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, history: History) -> None:
+        """Add a result to the cache
+
+        :param key: The key of the result
+        :type key: str
+        :param history: The result
+        :type history: History
+        """
+        self._remember(key, history)
+
+        if self.cache_dir is not None:
+            # Write to a temporary file so readers never see partial results
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(history, f)
+            os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key: str, history: Any) -> None:
+        """Add a result to the memory cache, evicting the least recently used
+        results"""
+        with self._lock:
+            self._results[key] = history
+            self._results.move_to_end(key)
+
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all results held in memory"""
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self) -> int:
+        return len(self._results)
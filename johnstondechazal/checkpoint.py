@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.checkpoint
+
+Checkpointed, resumable ground truth runs over the whole data set.  Each
+`(image, landmark, type, select_func, params)` unit is saved to the run
+manifest as soon as it completes, so a restarted run with the same parameters,
+floating point type and filters skips the completed units.
+
+"""
+__author__ = 'Ben Johnston'
+
+import hashlib
+import json
+import os
+from typing import Callable, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.cache import function_key, params_key
+from johnstondechazal.data import (LandmarkFilter, dataframe_to_numpy,
+                                   image_bounds, load_all_landmarks)
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.history import History
+from johnstondechazal.method import find_worst_partition
+from johnstondechazal.progress import CancellationToken, Progress
+
+
+def filters_key(filters: Union[LandmarkFilter, None]) -> Union[str, None]:
+    """A digest identifying the annotators, images and landmarks selected by
+    a filter
+
+    :param filters: The filters, `None` for all samples
+    :type filters: Union[LandmarkFilter, None]
+    :return: The digest, `None` if a predicate of the filter cannot be
+        identified, e.g. a lambda
+    :rtype: Union[str, None]
+    """
+
+    selections = {}
+    for name in ['workers', 'exclude_workers', 'types', 'images', 'landmarks']:
+        val = None if filters is None else getattr(filters, name)
+
+        # The order of a collection does not change the selection
+        if (val is not None) and not callable(val):
+            val = sorted(str(x) for x in val)
+
+        selections[name] = val
+
+    key = params_key(**selections)
+    if key is None:
+        return None
+
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class RunManifest:
+    """Record of the completed units of a run, saved as JSON lines"""
+    def __init__(self, path: str):
+        """Constructor
+
+        :param path: The path of the manifest, the completed units are loaded
+            if it exists
+        :type path: str
+        """
+        self.path = path
+        self.units = {}
+
+        if os.path.exists(path):
+            self._load()
+
+    @staticmethod
+    def key(image: str,
+            landmark: int,
+            type: Union[str, None],
+            select_func: Callable,
+            dtype: Union[np.dtype, None] = None,
+            filters: Union[LandmarkFilter, None] = None,
+            **params) -> Tuple:
+        """The key of a unit of work
+
+        :param image: The image
+        :type image: str
+        :param landmark: The landmark ID
+        :type landmark: int
+        :param type: The type of annotator selected
+        :type type: Union[str, None]
+        :param select_func: The select function of the elimination
+        :type select_func: Callable
+        :param dtype: The floating point type of the run, defaults to `None`
+        :type dtype: Union[np.dtype, None], optional
+        :param filters: The filters of the loaded landmarks, see
+            :func:`filters_key`, defaults to `None`
+        :type filters: Union[LandmarkFilter, None], optional
+        :raises ValueError: If a function parameter or a predicate of the
+            filters cannot be identified, e.g. a lambda
+        :return: The key of the unit
+        :rtype: Tuple
+
+        Additional keyword arguments are the parameters of the elimination.
+        """
+        params = params_key(**params)
+        filters = filters_key(filters)
+        if (params is None) or (filters is None):
+            raise ValueError('The parameters of the run cannot be identified')
+
+        dtype = None if dtype is None else np.dtype(dtype).str
+
+        return (image, int(landmark), type, function_key(select_func), params,
+                dtype, filters)
+
+    def _load(self) -> None:
+        """Load the completed units"""
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last record of an interrupted run may be incomplete
+                    continue
+
+                # Runs recorded before the settings were saved used the
+                # defaults
+                record.setdefault('params', params_key())
+                record.setdefault('dtype', None)
+                record.setdefault('filters', filters_key(None))
+
+                self.units[(record['image'], record['landmark'],
+                            record['type'], record['select_func'],
+                            record['params'], record['dtype'],
+                            record['filters'])] = record
+
+    def is_done(self, image: str, landmark: int, type: Union[str, None],
+                select_func: Callable, **kwargs) -> bool:
+        """Check if a unit has been completed with the same settings, see
+        :meth:`key`
+
+        :return: If the unit is complete
+        :rtype: bool
+        """
+        key = self.key(image, landmark, type, select_func, **kwargs)
+        return key in self.units
+
+    def add(self, image: str, landmark: int, type: Union[str, None],
+            select_func: Callable, history: History, **kwargs) -> None:
+        """Save a completed unit, see :meth:`key`
+
+        :param history: The history of the unit
+        :type history: History
+        """
+        key = self.key(image, landmark, type, select_func, **kwargs)
+        record = {
+            'image': key[0],
+            'landmark': key[1],
+            'type': key[2],
+            'select_func': key[3],
+            'params': key[4],
+            'dtype': key[5],
+            'filters': key[6],
+            'loc': [float(x) for x in history.loc],
+            'elimination_order': [
+                str(x) for x in history.elimination_order.workerid
+            ],
+        }
+
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.units[key] = record
+
+    def results(self) -> pd.DataFrame:
+        """Get the results of the completed units
+
+        :return: The final location, elimination order and parameters of each
+            unit
+        :rtype: pd.DataFrame
+        """
+        records = list(self.units.values())
+        df = pd.DataFrame.from_records(records,
+                                       columns=[
+                                           'image', 'landmark', 'type',
+                                           'select_func', 'params', 'dtype',
+                                           'filters', 'loc',
+                                           'elimination_order'
+                                       ])
+        df['x'] = [x[0] for x in df['loc']]
+        df['y'] = [x[1] for x in df['loc']]
+        del df['loc']
+
+        return df
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+
+def run_corpus(gt: FindGrouthTruth,
+               manifest: Union[RunManifest, str],
+               images: Union[Sequence[str], None] = None,
+               types: Sequence[Union[str, None]] = (None, ),
+               select_func: Callable = find_worst_partition,
+               progress: Union[Callable, bool, None] = None,
+               cancel: Union[CancellationToken, None] = None,
+               **kwargs) -> pd.DataFrame:
+    """Compute the ground truth of every landmark of every image, skipping the
+    units already completed in the manifest with the same parameters,
+    floating point type and filters.  Images without landmarks of a type have
+    no units of the type.
+
+    :param gt: The ground truth finder
+    :type gt: FindGrouthTruth
+    :param manifest: The run manifest or the path of the manifest
+    :type manifest: Union[RunManifest, str]
+    :param images: The selected images, defaults to `None` for all images
+    :type images: Union[Sequence[str], None], optional
+    :param types: The annotator types to compute the ground truth of, `None`
+        for all annotators, defaults to (None, )
+    :type types: Sequence[Union[str, None]], optional
+    :param select_func: The function used to select the annotators to
+        exclude each iteration, defaults to
+        :func:`~johnstondechazal.method.find_worst_partition`
+    :type select_func: Callable, optional
+    :param progress: Report the units completed, see
+        :class:`~johnstondechazal.progress.Progress`, defaults to `None`
+    :type progress: Union[Callable, bool, None], optional
+    :param cancel: Token to stop the run, completed units remain in the
+        manifest, defaults to `None`
+    :type cancel: Union[CancellationToken, None], optional
+    :raises ValueError: If a function parameter or a predicate of the filters
+        cannot be identified, e.g. a lambda
+    :return: The results of every completed unit
+    :rtype: pd.DataFrame
+
+    Additional keyword arguments are passed to
+    :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select`,
+    the `bounds` default to the size of each image.
+    """
+
+    if isinstance(manifest, str):
+        manifest = RunManifest(manifest)
+
+    # The settings the units are computed with
+    settings = dict(kwargs, dtype=gt.dtype, filters=gt.filters)
+
+    df = load_all_landmarks(dirpath=gt.data_dir,
+                            cancel=cancel,
+                            filters=gt.filters)
+
+    if images is None:
+        images = sorted(df.filename.unique())
+
+    landmarks = sorted(x for x in df.columns if isinstance(x, int))
+
+    # The images with landmarks of each type
+    annotated = {}
+    for _type in types:
+        select = df if _type is None else df.loc[df.type == _type]
+        annotated[_type] = set(select.filename)
+
+    units = [(_type, image) for _type in types for image in images
+             if image in annotated[_type]]
+
+    with Progress(len(units) * len(landmarks), progress, cancel,
+                  desc='units') as prog:
+        prog.update(
+            sum(
+                manifest.is_done(image, lmrk, _type, select_func, **settings)
+                for _type, image in units for lmrk in landmarks))
+
+        for _type in types:
+            df_type = df if _type is None else df.loc[df.type == _type]
+
+            for image in images:
+                if image not in annotated[_type]:
+                    continue
+
+                pending = [(idx, lmrk) for idx, lmrk in enumerate(landmarks)
+                           if not manifest.is_done(image, lmrk, _type,
+                                                   select_func, **settings)]
+                if not pending:
+                    continue
+
+                prog.check(manifest)
+                df_image = df_type.loc[df_type.filename == image]
+                arr, meta = dataframe_to_numpy(df_image,
+                                               dtype=gt.dtype,
+                                               squeeze=False)
+                params = {'bounds': image_bounds(df_image), **kwargs}
+
+                for idx, lmrk in pending:
+                    prog.check(manifest)
+
+                    history = gt.converge_select(arr[:, :, idx],
+                                                 meta,
+                                                 select_func=select_func,
+                                                 **params)
+                    manifest.add(image, lmrk, _type, select_func, history,
+                                 **settings)
+                    prog.update()
+
+    return manifest.results()
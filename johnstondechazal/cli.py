@@ -3,7 +3,8 @@ import sys
 
 import click
 
-from johnstondechazal.data import PKG_DIR, download_data
+from johnstondechazal.data import (IMAGE_DIR, LANDMARK_DIR, PKG_DIR,
+                                   download_data)
 
 
 @click.group()
@@ -16,7 +17,93 @@ def main():
 def get_data(dest):
     """Download the Johnston & de Chazal dataset to DEST, where the default location is
     the johnstondechazal package directory"""
-    download_data(dest)
+    download_data(dest, progress=True)
+
+
+@main.command()
+@click.argument('output_dir')
+@click.option('--data-dir',
+              default=LANDMARK_DIR,
+              help='The directory containing the landmark data')
+@click.option('--image-dir',
+              default=IMAGE_DIR,
+              help='The directory containing the images')
+@click.option('--type',
+              default=None,
+              help='Only use annotators of this type, e.g. expert')
+@click.option('--traces/--no-traces',
+              default=True,
+              help='Draw the convergence path of each landmark')
+@click.option('--processes',
+              default=None,
+              type=int,
+              help='The number of processes, defaults to the number of CPUs')
+def render(output_dir, data_dir, image_dir, type, traces, processes):
+    """Render the ground truth of every image as a PNG in OUTPUT_DIR"""
+    from johnstondechazal.visualise import render_overlays
+
+    for path in render_overlays(output_dir,
+                                data_dir=data_dir,
+                                image_dir=image_dir,
+                                type=type,
+                                traces=traces,
+                                processes=processes):
+        click.echo(path)
+
+
+@main.command()
+@click.argument('manifest')
+@click.option('--data-dir',
+              default=LANDMARK_DIR,
+              help='The directory containing the landmark data')
+@click.option('--type',
+              'types',
+              multiple=True,
+              help='Annotator type to compute, may be repeated, '
+              'defaults to all annotators')
+def run(manifest, data_dir, types):
+    """Compute the ground truth of every image and landmark, saving each
+    result to MANIFEST as it completes.  Rerunning with the same MANIFEST
+    resumes the run."""
+    from johnstondechazal.checkpoint import run_corpus
+    from johnstondechazal.groundtruth import FindGrouthTruth
+
+    gt = FindGrouthTruth(data_dir, download=False)
+    results = run_corpus(gt, manifest, types=types or (None, ), progress=True)
+    click.echo(f'{len(results)} units completed')
+
+
+@main.command()
+@click.option('--data-dir',
+              default=LANDMARK_DIR,
+              help='The directory containing the landmark data')
+@click.option('--host', default='127.0.0.1', help='The host to listen on')
+@click.option('--port', default=8000, help='The port to listen on')
+@click.option('--unix-socket',
+              default=None,
+              help='Listen on this Unix socket instead of a TCP port')
+@click.option('--cache-dir',
+              default=None,
+              help='Directory to keep the results in between runs')
+def serve(data_dir, host, port, unix_socket, cache_dir):
+    """Serve ground truth queries, e.g.
+    GET /groundtruth?image=IMAGE&landmark=ID&type=TYPE"""
+    from johnstondechazal.cache import ResultCache
+    from johnstondechazal.groundtruth import FindGrouthTruth
+    from johnstondechazal.server import make_server
+
+    gt = FindGrouthTruth(data_dir,
+                         download=False,
+                         cache=ResultCache(maxsize=4096, cache_dir=cache_dir))
+    server = make_server(gt, host=host, port=port, unix_socket=unix_socket)
+    click.echo(f'Serving on {unix_socket or f"http://{host}:{port}"}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 if __name__ == "__main__":
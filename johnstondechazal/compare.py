@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.compare
+
+Comparison of the ground truth computed from each type of annotator, e.g. the
+experts and the MTurk workers.  The corpus is loaded once and the elimination
+of every image, landmark and type is computed in a single batch.
+
+"""
+__author__ = 'Ben Johnston'
+
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.data import LandmarkFilter, load_all_landmarks
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import BatchSelectResult, converge_select_batch
+from johnstondechazal.shared import corpus_problems, corpus_tensor
+
+
+def batch_locations(result: BatchSelectResult, landmarks: np.ndarray,
+                    mask: np.ndarray) -> np.ndarray:
+    """Get the final ground truth location of each problem of a batch
+
+    :param result: The result of
+        :func:`~johnstondechazal.method.converge_select_batch`
+    :type result: BatchSelectResult
+    :param landmarks: The stacked landmarks of the problems
+    :type landmarks: np.ndarray
+    :param mask: The mask of the annotators of each problem
+    :type mask: np.ndarray
+    :return: The location of each problem, the replicate mean of the
+        annotator of a problem with a single annotator and NaN for a problem
+        without annotators
+    :rtype: np.ndarray
+    """
+
+    num_problems = len(mask)
+    locs = np.full((num_problems, 2), np.nan, dtype=result.means.dtype)
+
+    eliminated = result.steps > 0
+    locs[eliminated] = result.means[eliminated, result.steps[eliminated] - 1]
+
+    # A batch without annotators has no annotator to index
+    single = mask.sum(axis=1) == 1
+    if single.any():
+        locs[single] = landmarks[single,
+                                 mask[single].argmax(axis=1)].mean(axis=1)
+
+    return locs
+
+
+def compare_types(
+    gt: FindGrouthTruth,
+    images: Union[Sequence[str], None] = None,
+    types: Tuple[str, str] = ('expert', 'worker'),
+    iterations: int = 20,
+    tol: float = 1e-4,
+    criterion: str = 'all',
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Compare the ground truth computed from two types of annotators.  The
+    ground truth of each type matches
+    :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select` with
+    :func:`~johnstondechazal.method.find_worst_partition` and the mean
+    initial estimate.
+
+    :param gt: The ground truth finder
+    :type gt: FindGrouthTruth
+    :param images: The selected images, defaults to `None` for all images
+    :type images: Union[Sequence[str], None], optional
+    :param types: The reference and compared types of annotator, defaults to
+        ('expert', 'worker')
+    :type types: Tuple[str, str], optional
+    :param iterations: Number iterations of each convergence, defaults to 20
+    :type iterations: int, optional
+    :param tol: The convergence tolerance, defaults to 1e-4
+    :type tol: float, optional
+    :param criterion: The stopping rule of the convergence, see
+        :func:`~johnstondechazal.method.has_converged`, defaults to 'all'
+    :type criterion: str, optional
+    :return: The location of each type and the error of the compared type
+        for each landmark of each image, and the mean, median and maximum
+        error of each image
+    :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+    """
+
+    filters = (gt.filters or LandmarkFilter()).restrict(types=types,
+                                                        images=images)
+    df = load_all_landmarks(dirpath=gt.data_dir, filters=filters)
+
+    landmark_ids = sorted(x for x in df.columns if isinstance(x, int))
+    tensor, meta, images = corpus_tensor(df,
+                                         images,
+                                         dtype=gt.dtype or np.float64)
+    problems, mask = corpus_problems(tensor)
+    num_problems = len(problems)
+
+    # Stack the problems of both types into a single batch
+    type_masks = [mask & (meta.type == _type).values for _type in types]
+    mask = np.concatenate(type_masks)
+    problems = np.concatenate([problems] * len(types))
+
+    result = converge_select_batch(problems,
+                                   mask,
+                                   iterations=iterations,
+                                   tol=tol,
+                                   criterion=criterion)
+    locs = batch_locations(result, problems, mask)
+    ref_locs, cmp_locs = locs[:num_problems], locs[num_problems:]
+
+    landmarks = pd.DataFrame({
+        'image': np.repeat(images, len(landmark_ids)),
+        'landmark': np.tile(landmark_ids, len(images)),
+    })
+
+    for _type, _locs, _mask in zip(types, (ref_locs, cmp_locs), type_masks):
+        landmarks[f'{_type}_x'] = _locs[:, 0]
+        landmarks[f'{_type}_y'] = _locs[:, 1]
+        landmarks[f'{_type}_annotators'] = _mask.sum(axis=1)
+
+    error = cmp_locs - ref_locs
+    landmarks['dx'] = error[:, 0]
+    landmarks['dy'] = error[:, 1]
+    landmarks['error'] = np.linalg.norm(error, axis=1)
+
+    summary = landmarks.groupby('image').error.agg(['mean', 'median', 'max'])
+    summary.columns = ['mean_error', 'median_error', 'max_error']
+
+    return landmarks, summary.reset_index()
@@ -7,17 +7,24 @@
 """
 __author__ = 'Ben Johnston'
 
+import hashlib
 import json
 import os
 import tempfile
+import threading
 import urllib.request
+from collections import OrderedDict
 from glob import glob
-from typing import Tuple, Union
+from typing import Callable, Collection, Hashable, List, Tuple, Union
 from zipfile import ZipFile
 
 import numpy as np
 import pandas as pd
-from imageio import imread
+from imageio import imread, imwrite
+from PIL import Image
+
+from johnstondechazal.instrument import timed
+from johnstondechazal.progress import CancellationToken, Progress
 
 LANDMARK_REPO = 'https://github.com/doc-E-brown/'\
     'facial-landmarks/archive/master.zip'
@@ -26,9 +33,15 @@ PKG_DIR = os.path.abspath(os.path.dirname(__file__))
 LANDMARK_DIR = os.path.join(PKG_DIR, 'facial-landmarks-master')
 IMAGE_DIR = os.path.join(LANDMARK_DIR, 'images')
 IMAGE_FILES = [os.path.basename(x) for x in glob(f'{IMAGE_DIR}/*.*')]
+PYRAMID_DIR = os.path.join(LANDMARK_DIR, 'pyramid')
+
+# The columns of each sample, followed by the landmark IDs
+SAMPLE_COLUMNS = ['filename', 'workerid', 'type', 'width', 'height']
 
 
-def download_data(extract_path: str = PKG_DIR) -> None:
+def download_data(extract_path: str = PKG_DIR,
+                  progress: Union[Callable, bool, None] = None,
+                  cancel: Union[CancellationToken, None] = None) -> None:
     """
     Download facial landmark data from github into
     the package directory
@@ -36,50 +49,251 @@ def download_data(extract_path: str = PKG_DIR) -> None:
     :param extract_path: The extraction path for the landmark
         data, defaults to the package path.
     :type extract_path: str
+    :param progress: Report the bytes downloaded, see
+        :class:`~johnstondechazal.progress.Progress`, defaults to `None`
+    :type progress: Union[Callable, bool, None], optional
+    :param cancel: Token to cancel the download, defaults to `None`
+    :type cancel: Union[CancellationToken, None], optional
 
     """
-    with tempfile.NamedTemporaryFile(mode='w+b') as _zip:
-        urllib.request.urlretrieve(LANDMARK_REPO, _zip.name)
-        _zip.seek(0)
-
-        with ZipFile(_zip.name) as _zip_contents:
-            _zip_contents.extractall(extract_path)
+    with Progress(progress=progress, cancel=cancel, desc='download') as prog:
+
+        def _report(num_blocks, block_size, total_size):
+            prog.check()
+
+            if total_size > 0:
+                prog.set_total(total_size)
+
+            if num_blocks > 0:
+                prog.update(block_size)
+
+        with tempfile.NamedTemporaryFile(mode='w+b') as _zip:
+            urllib.request.urlretrieve(LANDMARK_REPO, _zip.name, _report)
+            _zip.seek(0)
+
+            with ZipFile(_zip.name) as _zip_contents:
+                for member in _zip_contents.infolist():
+                    prog.check()
+                    _zip_contents.extract(member, extract_path)
+
+
+def _selected(value: Hashable, select: Union[Collection, Callable,
+                                              None]) -> bool:
+    """Check if a value is selected by a collection or predicate"""
+
+    if select is None:
+        return True
+
+    if callable(select):
+        return bool(select(value))
+
+    return value in select
+
+
+def _both(first: Union[Collection, Callable, None],
+          second: Union[Collection, Callable, None]) -> Union[Collection,
+                                                              Callable, None]:
+    """Combine two selections, selecting the values selected by both"""
+
+    if first is None:
+        return second
+
+    if second is None:
+        return first
+
+    return lambda value: _selected(value, first) and _selected(value, second)
+
+
+class LandmarkFilter:
+    """Select the annotators, images and landmarks loaded from the landmark
+    files.  The samples of excluded annotators and images are skipped before
+    their landmarks are parsed and only the selected landmarks are extracted.
+    Each selection is either a collection of the selected values or a
+    predicate called with each value."""
+    def __init__(self,
+                 workers: Union[Collection, Callable, None] = None,
+                 exclude_workers: Union[Collection, Callable, None] = None,
+                 types: Union[Collection, Callable, None] = None,
+                 images: Union[Collection, Callable, None] = None,
+                 landmarks: Union[Collection, Callable, None] = None):
+        """Constructor
+
+        :param workers: The worker IDs to load, e.g. a whitelist, defaults to
+            `None` for all workers
+        :type workers: Union[Collection, Callable, None], optional
+        :param exclude_workers: The worker IDs to skip, e.g. a blacklist,
+            defaults to `None`
+        :type exclude_workers: Union[Collection, Callable, None], optional
+        :param types: The annotator types to load, e.g. `['expert']`, defaults
+            to `None` for all types
+        :type types: Union[Collection, Callable, None], optional
+        :param images: The image filenames to load, defaults to `None` for all
+            images
+        :type images: Union[Collection, Callable, None], optional
+        :param landmarks: The landmark IDs to load, e.g. `[37, 40]`, defaults
+            to `None` for all landmarks
+        :type landmarks: Union[Collection, Callable, None], optional
+        """
+        self.workers = workers
+        self.exclude_workers = exclude_workers
+        self.types = types
+        self.images = images
+        self.landmarks = landmarks
+
+    def accept_worker(self, workerid: str, type: str) -> bool:
+        """Check if the samples of an annotator are loaded
+
+        :param workerid: The worker ID
+        :type workerid: str
+        :param type: The type of annotator
+        :type type: str
+        :return: If the annotator is selected
+        :rtype: bool
+        """
+        if (self.exclude_workers is not None) and _selected(
+                workerid, self.exclude_workers):
+            return False
+
+        return _selected(workerid, self.workers) and _selected(
+            type, self.types)
+
+    def accept_image(self, image: str) -> bool:
+        """Check if the samples of an image are loaded
+
+        :param image: The image filename
+        :type image: str
+        :return: If the image is selected
+        :rtype: bool
+        """
+        return _selected(image, self.images)
+
+    def accept_landmark(self, landmark: int) -> bool:
+        """Check if a landmark is loaded
+
+        :param landmark: The landmark ID
+        :type landmark: int
+        :return: If the landmark is selected
+        :rtype: bool
+        """
+        return _selected(landmark, self.landmarks)
+
+    def restrict(self,
+                 types: Union[Collection, Callable, None] = None,
+                 images: Union[Collection, Callable, None] = None,
+                 landmarks: Union[Collection, Callable, None] = None
+                 ) -> 'LandmarkFilter':
+        """Create a filter selecting a subset of this filter
+
+        :param types: The annotator types to load, defaults to `None`
+        :type types: Union[Collection, Callable, None], optional
+        :param images: The image filenames to load, defaults to `None`
+        :type images: Union[Collection, Callable, None], optional
+        :param landmarks: The landmark IDs to load, defaults to `None`
+        :type landmarks: Union[Collection, Callable, None], optional
+        :return: The filter selecting the annotators, images and landmarks
+            selected by both
+        :rtype: LandmarkFilter
+        """
+        return LandmarkFilter(workers=self.workers,
+                              exclude_workers=self.exclude_workers,
+                              types=_both(self.types, types),
+                              images=_both(self.images, images),
+                              landmarks=_both(self.landmarks, landmarks))
+
+
+def _landmark_id(input_json: dict) -> int:
+    """The ID of a json landmark, e.g. 12 for P12"""
+
+    return int(input_json["id"][1:])
 
 
 def _json_to_landmarks(input_json: dict) -> Tuple[str, Tuple[int, int]]:
     """Convert json to landmarks for DataFrame"""
 
-    _id = int(input_json["id"][1:])
+    _id = _landmark_id(input_json)
     return (_id, (input_json['user_x'], input_json['user_y']))
 
 
-def json_landmarks_to_dataframe(filepath: str) -> Tuple[str, pd.DataFrame]:
-    """ Load landmarks from a json file as pandas Dataframe """
+def json_landmarks_to_dataframe(
+        filepath: str,
+        filters: Union[LandmarkFilter, None] = None,
+        landmarks: Union[Collection, None] = None) -> pd.DataFrame:
+    """ Load landmarks from a json file as pandas Dataframe
+
+    :param filepath: The path of the json file
+    :type filepath: str
+    :param filters: The annotators, images and landmarks to load, the samples
+        of an excluded annotator are not parsed, defaults to `None` for all
+        samples
+    :type filters: Union[LandmarkFilter, None], optional
+    :param landmarks: The landmark IDs to extract, defaults to `None` for all
+        landmarks
+    :type landmarks: Union[Collection, None], optional
+    :return: The landmarks of each sample
+    :rtype: pd.DataFrame
+    """
+
+    if landmarks is not None:
+        filters = (filters or LandmarkFilter()).restrict(landmarks=landmarks)
+
+    # The ID of an expert is the filename, so an excluded expert is skipped
+    # without parsing the file
+    expert = os.path.splitext(os.path.basename(filepath))[0]
+    skip_expert = (filters is not None) and not filters.accept_worker(
+        expert, 'expert')
+
+    if skip_expert and not _selected('worker', filters.types):
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
 
     with open(filepath, 'r') as f:
-        data = json.load(f)
+        text = f.read()
+
+    # Only MTurk results record the worker ID
+    if skip_expert and '"WorkerId"' not in text:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+
+    data = json.loads(text)
 
     # Check if this is a MTURK or expert result
     if 'WorkerId' in data.keys():
         worker = data['WorkerId']
-        data = data['Answers'][1]['FreeText']
-        data = json.loads(data)
         _typ = 'worker'
 
     # expert result
     else:
-        worker = os.path.splitext(os.path.basename(filepath))[0]
-        data = data['results']
+        worker = expert
         _typ = 'expert'
 
-    data_frame = {'filename': [], 'workerid': [], 'type': []}
+    if (filters is not None) and not filters.accept_worker(worker, _typ):
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+
+    if _typ == 'worker':
+        data = json.loads(data['Answers'][1]['FreeText'])
+    else:
+        data = data['results']
+
+    data_frame = {col: [] for col in SAMPLE_COLUMNS}
+
+    select_landmarks = (filters is not None) and (filters.landmarks
+                                                  is not None)
 
     for samp in data['samples']:
-        data_frame['filename'].append(os.path.basename(samp['filename']))
+        filename = os.path.basename(samp['filename'])
+
+        if (filters is not None) and not filters.accept_image(filename):
+            continue
+
+        data_frame['filename'].append(filename)
         data_frame['workerid'].append(worker)
         data_frame['type'].append(_typ)
+        data_frame['width'].append(samp.get('width'))
+        data_frame['height'].append(samp.get('height'))
 
         for lmrk in samp['landmarks']:
+            if select_landmarks and not filters.accept_landmark(
+                    _landmark_id(lmrk)):
+                continue
+
             _id, *coords = _json_to_landmarks(lmrk)
 
             if _id in data_frame:
@@ -87,11 +301,24 @@ def json_landmarks_to_dataframe(filepath: str) -> Tuple[str, pd.DataFrame]:
             else:
                 data_frame[_id] = coords
 
+    # A file without selected samples keeps the landmark columns
+    if not data_frame['filename'] and data['samples']:
+        for lmrk in data['samples'][0]['landmarks']:
+            _id = _landmark_id(lmrk)
+            if (not select_landmarks) or filters.accept_landmark(_id):
+                data_frame[_id] = []
+
     return pd.DataFrame.from_dict(data_frame)
 
 
-def load_all_landmarks(image: Union[str, None] = None,
-                       dirpath: str = LANDMARK_DIR) -> pd.DataFrame:
+@timed('load_all_landmarks')
+def load_all_landmarks(
+        image: Union[str, None] = None,
+        dirpath: str = LANDMARK_DIR,
+        progress: Union[Callable, bool, None] = None,
+        cancel: Union[CancellationToken, None] = None,
+        filters: Union[LandmarkFilter, None] = None,
+        landmarks: Union[Collection, None] = None) -> pd.DataFrame:
     """Load all the landmarks into a dataframe
 
     :param image: return landmarks for the selected image,
@@ -99,11 +326,30 @@ def load_all_landmarks(image: Union[str, None] = None,
     :type image: Union[str, None]
     :param dirpath: root path of all landmarks
     :type dirpath: str
+    :param progress: Report the files loaded, see
+        :class:`~johnstondechazal.progress.Progress`, defaults to `None`
+    :type progress: Union[Callable, bool, None], optional
+    :param cancel: Token to cancel loading, the files loaded before the
+        cancellation are available from
+        :attr:`~johnstondechazal.progress.Cancelled.partial`, defaults to
+        `None`
+    :type cancel: Union[CancellationToken, None], optional
+    :param filters: The annotators, images and landmarks to load, the
+        samples excluded are skipped while parsing, defaults to `None` for all
+        samples
+    :type filters: Union[LandmarkFilter, None], optional
+    :param landmarks: The landmark IDs to load, only these landmarks are
+        extracted from the samples, defaults to `None` for all landmarks
+    :type landmarks: Union[Collection, None], optional
     :return: landmarks for all workers, images and replicates
     :rtype: pd.DataFrame
     """
 
-    df = pd.DataFrame()
+    if (image is not None) or (landmarks is not None):
+        filters = (filters or LandmarkFilter()).restrict(
+            images=None if image is None else [image], landmarks=landmarks)
+
+    filepaths = []
     for root, dirname, filenames in os.walk(dirpath):
 
         for fname in filenames:
@@ -111,30 +357,52 @@ def load_all_landmarks(image: Union[str, None] = None,
             if '.json' not in fname:
                 continue
 
-            df = df.append(json_landmarks_to_dataframe(
-                os.path.join(root, fname)),
-                           ignore_index=True)
+            filepaths.append(os.path.join(root, fname))
+
+    frames = []
+    with Progress(len(filepaths), progress, cancel, desc='landmarks') as prog:
+        for filepath in filepaths:
+            prog.check(frames)
+
+            frames.append(json_landmarks_to_dataframe(filepath, filters))
+
+            prog.update()
+
+    # A selection matching nothing keeps the columns of the samples
+    df = pd.concat([x for x in frames if not x.empty] or frames
+                   or [pd.DataFrame(columns=SAMPLE_COLUMNS)],
+                   ignore_index=True)
 
     # sort the columns
     _cols = [x for x in df.columns if isinstance(x, int)]
     _cols.sort()
 
-    _cols = [x for x in df.columns if isinstance(x, str)] + _cols
-
-    df = df[_cols]
+    df = df.reindex(columns=SAMPLE_COLUMNS + _cols)
 
     if image is not None:
-        df = df.loc[df.filename == image]
         del df['filename']
 
     return df
 
 
-def dataframe_to_numpy(df: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
+@timed('dataframe_to_numpy')
+def dataframe_to_numpy(
+    df: pd.DataFrame,
+    dtype: Union[np.dtype, None] = None,
+    squeeze: bool = True,
+) -> Tuple[np.ndarray, pd.DataFrame]:
     """Return numpy array of coordinates from a selection dataframe
 
     :param df: Input dataframe from test results
     :type df: pd.DataFrame
+    :param dtype: The type of the coordinate array, e.g. `np.float32`,
+        defaults to `None` to infer the type from the coordinates
+    :type dtype: Union[np.dtype, None], optional
+    :param squeeze: Return only the coordinates of the annotator if there is
+        a single annotator, set to `False` to always return the coordinates
+        with shape `(annotators, replicates, landmarks, 2)` and the metadata,
+        defaults to `True`
+    :type squeeze: bool, optional
     :return: Selected coordinates and the metadata for the corrdinates
     :rtype: Union[np.ndarray, pd.DataFrame]
     """
@@ -165,9 +433,12 @@ def dataframe_to_numpy(df: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
 
         array.append(worker_arr)
 
-    array = np.array(array)
+    if array:
+        array = np.array(array, dtype=dtype)
+    else:
+        array = np.empty((0, 0, len(cols), 2), dtype=dtype or np.float64)
 
-    if array.shape[0] == 1:
+    if squeeze and array.shape[0] == 1:
         return array[0]
 
     df_meta.index = range(len(df_meta))
@@ -175,15 +446,278 @@ def dataframe_to_numpy(df: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
     return array, df_meta
 
 
-def load_image(image: str, image_dir: str = IMAGE_DIR) -> np.ndarray:
+def read_image_size(image: str, image_dir: str = IMAGE_DIR) -> Tuple[int, int]:
+    """Read the size of an image from the image header without decoding the
+    pixels
+
+    :param image: The image name
+    :type image: str
+    :param image_dir: The directory containing the images, defaults to
+        IMAGE_DIR
+    :type image_dir: str, optional
+    :return: The width and height of the image
+    :rtype: Tuple[int, int]
+    """
+
+    with Image.open(os.path.join(image_dir, image)) as img:
+        return img.size
+
+
+def image_bounds(df: pd.DataFrame) -> Union[Tuple[float, float], None]:
+    """Get the size of an image recorded with its landmarks
+
+    :param df: Landmarks of a single image from :func:`load_all_landmarks`
+    :type df: pd.DataFrame
+    :return: The width and height of the image, `None` if the size was not
+        recorded
+    :rtype: Union[Tuple[float, float], None]
+    """
+
+    sizes = df[['width', 'height']].dropna()
+    if sizes.empty:
+        return None
+
+    width, height = sizes.iloc[0]
+    return float(width), float(height)
+
+
+def landmarks_in_bounds(df: pd.DataFrame,
+                        image_dir: Union[str, None] = None) -> pd.DataFrame:
+    """Check the landmarks fall within the bounds of the images
+
+    :param df: Landmarks from :func:`load_all_landmarks`
+    :type df: pd.DataFrame
+    :param image_dir: If provided the image sizes are read from the headers
+        of the images in this directory, which requires the `filename` column.
+        Defaults to `None` to use the `width` and `height` recorded with the
+        landmarks
+    :type image_dir: Union[str, None], optional
+    :return: For each row and landmark whether the landmark is within the
+        image
+    :rtype: pd.DataFrame
+    """
+
+    if image_dir is None:
+        width = df.width.values.astype(float)
+        height = df.height.values.astype(float)
+    else:
+        sizes = {
+            image: read_image_size(image, image_dir)
+            for image in df.filename.unique()
+        }
+        width = np.array([sizes[image][0] for image in df.filename])
+        height = np.array([sizes[image][1] for image in df.filename])
+
+    cols = [x for x in df.columns if isinstance(x, int)]
+    coords = np.array(df[cols].values.tolist(), dtype=float)
+
+    x, y = coords[..., 0], coords[..., 1]
+    inside = (x >= 0) & (x < width[:, np.newaxis]) & \
+        (y >= 0) & (y < height[:, np.newaxis])
+
+    return pd.DataFrame(inside, index=df.index, columns=cols)
+
+
+class ImageCache:
+    """Least recently used cache of loaded images limited to a total size in
+    bytes"""
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        """Constructor
+
+        :param max_bytes: The maximum total size of the cached images,
+            defaults to 256 MiB
+        :type max_bytes: int, optional
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Union[np.ndarray, None]:
+        """Get an image from the cache
+
+        :param key: The key of the image
+        :type key: Hashable
+        :return: The image or `None` if it is not in the cache
+        :rtype: Union[np.ndarray, None]
+        """
+        with self._lock:
+            img = self._images.get(key)
+
+            if img is not None:
+                self._images.move_to_end(key)
+
+            return img
+
+    def put(self, key: Hashable, img: np.ndarray) -> None:
+        """Add an image to the cache, evicting the least recently used images
+        to stay within the budget.  The cached image is made read only as it
+        is shared between callers.
+
+        :param key: The key of the image
+        :type key: Hashable
+        :param img: The image
+        :type img: np.ndarray
+        """
+        if img.nbytes > self.max_bytes:
+            return
+
+        img.setflags(write=False)
+
+        with self._lock:
+            if key in self._images:
+                self.nbytes -= self._images.pop(key).nbytes
+
+            self._images[key] = img
+            self.nbytes += img.nbytes
+            self._evict()
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the budget of the cache
+
+        :param max_bytes: The maximum total size of the cached images
+        :type max_bytes: int
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove all images from the cache"""
+        with self._lock:
+            self._images.clear()
+            self.nbytes = 0
+
+    def _evict(self) -> None:
+        """Remove the least recently used images until within budget"""
+        while self.nbytes > self.max_bytes:
+            _, img = self._images.popitem(last=False)
+            self.nbytes -= img.nbytes
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+
+IMAGE_CACHE = ImageCache()
+
+
+def _downsample(img: np.ndarray) -> np.ndarray:
+    """Halve the resolution of an image by averaging 2 x 2 blocks"""
+
+    height, width = img.shape[0] // 2, img.shape[1] // 2
+    blocks = img[:height * 2, :width * 2].reshape(
+        (height, 2, width, 2) + img.shape[2:])
+
+    return blocks.mean(axis=(1, 3)).astype(img.dtype)
+
+
+def _image_version(image: str, image_dir: str) -> str:
+    """Identify the source of an image by its directory and modification
+    time, so the levels of a pyramid are rebuilt when the image changes"""
+
+    path = os.path.abspath(os.path.join(image_dir, image))
+    source = f'{path}:{os.stat(path).st_mtime_ns}'
+
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def _pyramid_path(image: str, level: int, pyramid_dir: str,
+                  image_dir: str) -> str:
+    """The path of a level of an image pyramid"""
+
+    version = _image_version(image, image_dir)
+    return os.path.join(pyramid_dir,
+                        f'{os.path.splitext(image)[0]}_{version}_{level}.png')
+
+
+def build_image_pyramid(image: str,
+                        levels: int = 3,
+                        image_dir: str = IMAGE_DIR,
+                        pyramid_dir: str = PYRAMID_DIR) -> List[str]:
+    """Save downsampled copies of an image, each level half of the resolution
+    of the previous level
+
+    :param image: The image name
+    :type image: str
+    :param levels: The number of downsampled levels, defaults to 3
+    :type levels: int, optional
+    :param image_dir: The directory containing the images, defaults to
+        IMAGE_DIR
+    :type image_dir: str, optional
+    :param pyramid_dir: The directory to save the levels to, defaults to
+        PYRAMID_DIR
+    :type pyramid_dir: str, optional
+    :return: The paths of the levels from 1 to `levels`
+    :rtype: List[str]
+    """
+
+    os.makedirs(pyramid_dir, exist_ok=True)
+
+    img = imread(os.path.join(image_dir, image))
+    paths = []
+
+    for level in range(1, levels + 1):
+        img = _downsample(img)
+        path = _pyramid_path(image, level, pyramid_dir, image_dir)
+        imwrite(path, img)
+        paths.append(path)
+
+    return paths
+
+
+def load_image(image: str,
+               image_dir: str = IMAGE_DIR,
+               level: int = 0,
+               pyramid_dir: str = PYRAMID_DIR,
+               cache: bool = True,
+               copy: bool = False) -> np.ndarray:
     """Load image
 
-    :param image: [description]
+    :param image: The image name
     :type image: str
-    :param image_dir: [description], defaults to IMAGE_DIR
+    :param image_dir: The directory containing the images, defaults to
+        IMAGE_DIR
     :type image_dir: str, optional
-    :return: [description]
+    :param level: The level of the image pyramid, each level halves the
+        resolution and the landmark coordinates must be scaled by
+        `2 ** -level`.  Missing levels are built on first use, defaults to 0
+        for the original image
+    :type level: int, optional
+    :param pyramid_dir: The directory of the image pyramids, defaults to
+        PYRAMID_DIR
+    :type pyramid_dir: str, optional
+    :param cache: Use the images cached in :data:`IMAGE_CACHE`.  The cached
+        image is shared between callers and is read only, defaults to True
+    :type cache: bool, optional
+    :param copy: Return a writable copy of the cached image, defaults to
+        False
+    :type copy: bool, optional
+    :return: The image
     :rtype: np.ndarray
     """
 
-    return imread(os.path.join(image_dir, image))
+    version = _image_version(image, image_dir)
+    key = (version, level)
+
+    if cache:
+        img = IMAGE_CACHE.get(key)
+        if img is not None:
+            return img.copy() if copy else img
+
+    if level == 0:
+        img = imread(os.path.join(image_dir, image))
+    else:
+        path = _pyramid_path(image, level, pyramid_dir, image_dir)
+
+        if not os.path.exists(path):
+            build_image_pyramid(image, level, image_dir, pyramid_dir)
+
+        img = imread(path)
+
+    if cache:
+        IMAGE_CACHE.put(key, img)
+
+        if copy:
+            return img.copy()
+
+    return img
@@ -5,31 +5,79 @@
 Ground truth class
 
 """
+import inspect
 import os
-from typing import Callable, Tuple, Union
+from functools import partial
+from typing import Callable, Dict, List, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
-from johnstondechazal.data import (LANDMARK_DIR, dataframe_to_numpy,
-                                   download_data, load_all_landmarks)
+from johnstondechazal.cache import ResultCache
+from johnstondechazal.data import (LANDMARK_DIR, LandmarkFilter,
+                                   dataframe_to_numpy, download_data,
+                                   image_bounds, load_all_landmarks)
 from johnstondechazal.history import History
-from johnstondechazal.method import (converge_mean, find_worst_sum,
+from johnstondechazal.method import (IncrementalMean, converge_mean,
+                                     find_worst_partition, initial_estimate,
                                      select_landmarks)
+from johnstondechazal.progress import CancellationToken, Progress
+
+
+def _accepts_bounds(prefilter: Callable) -> bool:
+    """Check if the bounds of the image can be passed to a prefilter"""
+
+    # Bounds bound by the caller take precedence
+    if isinstance(prefilter, partial) and 'bounds' in prefilter.keywords:
+        return False
+
+    try:
+        params = inspect.signature(prefilter).parameters
+    except (TypeError, ValueError):
+        return False
+
+    return ('bounds' in params) or any(
+        x.kind == inspect.Parameter.VAR_KEYWORD for x in params.values())
 
 
 class FindGrouthTruth:
     """Class to find the ground truth landmark"""
-    def __init__(self, data_dir: str = LANDMARK_DIR):
+    def __init__(self,
+                 data_dir: str = LANDMARK_DIR,
+                 dtype: Union[np.dtype, None] = None,
+                 download: bool = True,
+                 cache: Union[ResultCache, None] = None,
+                 filters: Union[LandmarkFilter, None] = None):
         """Constructor
 
         :param data_dir: The directory containing the facial landmark data,
             defaults to LANDMARK_DIR
         :type data_dir: str, optional
+        :param dtype: The floating point type used to load, compute and store
+            the landmarks, e.g. `np.float32` to halve the memory used compared
+            to float64.  Defaults to `None` to use the type of the landmarks
+        :type dtype: Union[np.dtype, None], optional
+        :param download: Download the facial landmark data into `data_dir`,
+            set to `False` if the data is already available, defaults to
+            `True`
+        :type download: bool, optional
+        :param cache: Cache of the results of :meth:`converge_select`, the
+            cached histories are returned for identical landmarks, meta data
+            and parameters, defaults to `None`
+        :type cache: Union[ResultCache, None], optional
+        :param filters: The annotators and images loaded, e.g. to skip
+            blacklisted workers while parsing, defaults to `None` for all
+            annotators and images
+        :type filters: Union[LandmarkFilter, None], optional
         """
 
         self.data_dir = data_dir
-        self.download_data()
+        self.dtype = dtype
+        self.cache = cache
+        self.filters = filters
+
+        if download:
+            self.download_data()
 
     def download_data(self) -> None:
         """Download the facial landmark data"""
@@ -37,27 +85,78 @@ class FindGrouthTruth:
         download_data(self.data_dir)
 
     def load_landmarks_image(
-            self,
-            image: str,
-            type: Union[str, None] = None) -> Tuple[np.ndarray, pd.DataFrame]:
+        self,
+        image: str,
+        type: Union[str, None] = None,
+        landmarks: Union[Sequence[int], None] = None
+    ) -> Tuple[np.ndarray, pd.DataFrame]:
         """Load all landmarks and meta-data for an image
 
         :param image: The selected image
         :type image: str
+        :param type: The type of annotator selected, defaults to `None`
+        :type type: Union[str, None], optional
+        :param landmarks: The landmark IDs to load, defaults to `None` for all
+            landmarks
+        :type landmarks: Union[Sequence[int], None], optional
         :return: The facial landmark information and meta data collected during
             the experiment.
         :rtype: Tuple[np.ndarray, pd.DataFrame]
         """
 
-        df = load_all_landmarks(image=image, dirpath=self.data_dir)
-        if type is not None:
-            df = df.loc[df.type == type]
-        return dataframe_to_numpy(df)
+        df = self._load_image(image, type, landmarks)
+        return dataframe_to_numpy(df, dtype=self.dtype, squeeze=False)
+
+    def _load_image(self, image: str, type: Union[str, None],
+                    landmarks: Union[Sequence[int], None]) -> pd.DataFrame:
+        """Load the landmarks of an image, see :meth:`load_landmarks_image`"""
+
+        return load_all_landmarks(image=image,
+                                  dirpath=self.data_dir,
+                                  filters=self.restrict_filters(
+                                      type, landmarks=landmarks))
+
+    def restrict_filters(
+        self,
+        type: Union[str, None] = None,
+        images: Union[Sequence[str], None] = None,
+        landmarks: Union[Sequence[int], None] = None
+    ) -> Union[LandmarkFilter, None]:
+        """Get the filters of the loaded landmarks restricted to a type of
+        annotator, images and landmarks
+
+        :param type: The type of annotator selected, defaults to `None` for
+            all annotators
+        :type type: Union[str, None], optional
+        :param images: The images selected, defaults to `None` for all images
+        :type images: Union[Sequence[str], None], optional
+        :param landmarks: The landmark IDs selected, defaults to `None` for
+            all landmarks
+        :type landmarks: Union[Sequence[int], None], optional
+        :return: The filters
+        :rtype: Union[LandmarkFilter, None]
+        """
+        if (type is None) and (images is None) and (landmarks is None):
+            return self.filters
+
+        return (self.filters or LandmarkFilter()).restrict(
+            types=None if type is None else [type],
+            images=images,
+            landmarks=landmarks)
 
     def converge_select(self,
                         landmarks: np.ndarray,
                         meta: pd.DataFrame,
-                        select_func: Callable = find_worst_sum) -> History:
+                        select_func: Callable = find_worst_partition,
+                        refresh_tol: Union[float, None] = None,
+                        use_mask: bool = False,
+                        prefilter: Union[Callable, None] = None,
+                        init: str = 'mean',
+                        iterations: int = 20,
+                        tol: float = 1e-4,
+                        criterion: str = 'all',
+                        bounds: Union[Tuple[float, float], None] = None
+                        ) -> History:
         """Converge the mean for a landmark set by iteratively selecting the best
         annotators and recomputing the mean.
 
@@ -65,25 +164,345 @@ class FindGrouthTruth:
         :type landmarks: np.ndarray
         :param meta: The metadata
         :type meta: pd.DataFrame
-        :param num_select: The number of landmarks to select each iteration
-        :type num_select: float
-        :return: The history information of the process
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :param refresh_tol: If provided the mean is updated incrementally as
+            annotators are removed using :class:`IncrementalMean` and only
+            reconverged once it has moved further than `refresh_tol`.  The
+            landmarks are not recorded in the history in this mode, defaults
+            to `None`
+        :type refresh_tol: Union[float, None], optional
+        :param use_mask: Eliminate annotators by clearing a boolean mask of
+            the active annotators rather than copying the remaining
+            landmarks each iteration.  The landmarks are not recorded in the
+            history in this mode, defaults to `False`
+        :type use_mask: bool, optional
+        :param prefilter: A function returning a boolean mask of the
+            annotators to keep, e.g.
+            :func:`~johnstondechazal.method.prefilter_outliers` with the
+            bounds of the image.  The gross outliers are removed in a single
+            pass before the elimination starts and are recorded in
+            :attr:`History.filtered`, defaults to `None`
+        :type prefilter: Union[Callable, None], optional
+        :param init: The estimate the first convergence starts from, one of
+            `mean`, `median`, `trimmed` (see
+            :func:`~johnstondechazal.method.initial_estimate`) or `expert` for
+            the mean of the expert annotators, defaults to 'mean'
+        :type init: str, optional
+        :param iterations: The maximum number of iterations of each
+            convergence, defaults to 20
+        :type iterations: int, optional
+        :param tol: The convergence tolerance, defaults to 1e-4
+        :type tol: float, optional
+        :param criterion: The stopping rule of each convergence, see
+            :func:`~johnstondechazal.method.has_converged`, defaults to 'all'
+        :type criterion: str, optional
+        :param bounds: The width and height of the image, passed to a
+            `prefilter` with a `bounds` argument such as
+            :func:`~johnstondechazal.method.prefilter_outliers`.  The image
+            loaders pass the size recorded with the landmarks, defaults to
+            `None`
+        :type bounds: Union[Tuple[float, float], None], optional
+        :raises ValueError: If there are no annotators
+        :return: The history information of the process, including the
+            number of iterations used by each convergence
         :rtype: History
         """
 
-        history = History(meta)
+        params = {
+            'refresh_tol': refresh_tol,
+            'use_mask': use_mask,
+            'prefilter': prefilter,
+            'init': init,
+            'iterations': iterations,
+            'tol': tol,
+            'criterion': criterion,
+            'bounds': bounds,
+        }
+
+        if self.cache is None:
+            return self._converge_select(landmarks, meta, select_func,
+                                         **params)
+
+        dtype = None if self.dtype is None else np.dtype(self.dtype).str
+        key = self.cache.key(landmarks, meta, select_func, dtype=dtype,
+                             **params)
+        history = None if key is None else self.cache.get(key)
+
+        if history is None:
+            history = self._converge_select(landmarks, meta, select_func,
+                                            **params)
+
+            if key is not None:
+                self.cache.put(key, history)
+
+        return history
+
+    def _converge_select(self, landmarks: np.ndarray, meta: pd.DataFrame,
+                         select_func: Callable,
+                         refresh_tol: Union[float, None], use_mask: bool,
+                         prefilter: Union[Callable, None], init: str,
+                         iterations: int, tol: float, criterion: str,
+                         bounds: Union[Tuple[float, float], None]) -> History:
+        """Converge the mean for a landmark set, see :meth:`converge_select`"""
+
+        if not landmarks.shape[0]:
+            raise ValueError('There are no annotators to converge')
+
+        if self.dtype is not None:
+            landmarks = landmarks.astype(self.dtype, copy=False)
+
+        history = History(meta, dtype=self.dtype)
 
         # Add the global mean to the history
         mean = landmarks.mean(axis=0).mean(axis=0)
         history.add(mean, None, None)
 
+        # The indices of the remaining annotators within meta
+        active = np.arange(landmarks.shape[0])
+
+        if prefilter is not None:
+            if (bounds is not None) and _accepts_bounds(prefilter):
+                keep = prefilter(landmarks, bounds=bounds)
+            else:
+                keep = prefilter(landmarks)
+
+            if not np.any(keep):
+                raise ValueError('The prefilter removed every annotator')
+
+            history.add_filtered(active[~keep])
+            active = active[keep]
+            landmarks = landmarks[keep]
+
+        if init == 'expert':
+            experts = meta.type.values[active] == 'expert'
+            mean = initial_estimate(landmarks, 'mean', subset=experts)
+        else:
+            mean = initial_estimate(landmarks, init)
+
+        settings = {
+            'iterations': iterations,
+            'tol': tol,
+            'criterion': criterion,
+        }
+
+        if refresh_tol is not None:
+            return self._converge_select_incremental(landmarks, active, mean,
+                                                     history, select_func,
+                                                     refresh_tol, settings)
+
+        if use_mask:
+            return self._converge_select_mask(landmarks, active, mean, history,
+                                              select_func, settings)
+
         # Iterate for one less than number of annotators
         while 1:
-            mean, precision = converge_mean(landmarks)
-            landmarks, (inc, exc) = select_landmarks(precision, landmarks,
-                                                     select_func)
+            # Warm start from the previous step, one annotator has been
+            # removed so the previous mean is close to the new mean
+            result = converge_mean(landmarks,
+                                   initial_mean=mean,
+                                   full_output=True,
+                                   **settings)
+            mean = result.mean
+            landmarks, (inc, exc) = select_landmarks(result.precision,
+                                                     landmarks, select_func)
+            active = active[np.asarray(inc, dtype=int)]
 
-            history.add(mean, landmarks, inc)
+            history.add(mean, landmarks, active, iterations=result.iterations)
 
             if landmarks.shape[0] <= 1:
                 return history
+
+    def converge_landmarks(self,
+                           landmarks: np.ndarray,
+                           meta: pd.DataFrame,
+                           select_func: Callable = find_worst_partition,
+                           **kwargs) -> List[History]:
+        """Converge the mean of each landmark of an image
+
+        :param landmarks: The landmark set of an image with shape
+            `(annotators, replicates, landmarks, 2)`
+        :type landmarks: np.ndarray
+        :param meta: The metadata
+        :type meta: pd.DataFrame
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :return: The history of each landmark
+        :rtype: List[History]
+
+        Additional keyword arguments are passed to :meth:`converge_select`.
+        """
+
+        return [
+            self.converge_select(landmarks[:, :, idx],
+                                 meta,
+                                 select_func=select_func,
+                                 **kwargs) for idx in range(landmarks.shape[2])
+        ]
+
+    def converge_image(self,
+                       image: str,
+                       type: Union[str, None] = None,
+                       select_func: Callable = find_worst_partition,
+                       landmarks: Union[Sequence[int], None] = None,
+                       **kwargs) -> List[History]:
+        """Load the landmarks of an image and converge the mean of each
+        landmark
+
+        :param image: The selected image
+        :type image: str
+        :param type: The type of annotator to select, defaults to `None` for
+            all annotators
+        :type type: Union[str, None], optional
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :param landmarks: The landmark IDs to load and converge, defaults to
+            `None` for all landmarks
+        :type landmarks: Union[Sequence[int], None], optional
+        :return: The history of each landmark in order of the landmark ID
+        :rtype: List[History]
+
+        Additional keyword arguments are passed to :meth:`converge_select`,
+        the `bounds` default to the size of the image.
+        """
+
+        df = self._load_image(image, type, landmarks)
+        arr, meta = dataframe_to_numpy(df, dtype=self.dtype, squeeze=False)
+
+        return self.converge_landmarks(arr,
+                                       meta,
+                                       select_func=select_func,
+                                       **{
+                                           'bounds': image_bounds(df),
+                                           **kwargs
+                                       })
+
+    def converge_images(self,
+                        images: Union[Sequence[str], None] = None,
+                        type: Union[str, None] = None,
+                        select_func: Callable = find_worst_partition,
+                        progress: Union[Callable, bool, None] = None,
+                        cancel: Union[CancellationToken, None] = None,
+                        landmarks: Union[Sequence[int], None] = None,
+                        **kwargs) -> Dict[str, List[History]]:
+        """Converge the mean of each landmark of a number of images, loading
+        the landmarks once
+
+        :param images: The selected images, defaults to `None` for all images
+        :type images: Union[Sequence[str], None], optional
+        :param type: The type of annotator to select, defaults to `None` for
+            all annotators
+        :type type: Union[str, None], optional
+        :param select_func: The function used to select the annotators to
+            exclude each iteration, defaults to
+            :func:`~johnstondechazal.method.find_worst_partition`
+        :type select_func: Callable, optional
+        :param progress: Report the images completed, see
+            :class:`~johnstondechazal.progress.Progress`, defaults to `None`
+        :type progress: Union[Callable, bool, None], optional
+        :param cancel: Token to cancel the job, the images completed before
+            the cancellation are available from
+            :attr:`~johnstondechazal.progress.Cancelled.partial`, defaults to
+            `None`
+        :type cancel: Union[CancellationToken, None], optional
+        :param landmarks: The landmark IDs to load and converge, defaults to
+            `None` for all landmarks
+        :type landmarks: Union[Sequence[int], None], optional
+        :return: The history of each landmark of each image
+        :rtype: Dict[str, List[History]]
+
+        Additional keyword arguments are passed to :meth:`converge_select`,
+        the `bounds` default to the size of each image.
+        """
+
+        df = load_all_landmarks(dirpath=self.data_dir,
+                                cancel=cancel,
+                                filters=self.restrict_filters(
+                                    type, images, landmarks))
+
+        if images is None:
+            images = sorted(df.filename.unique())
+
+        results = {}
+        with Progress(len(images), progress, cancel, desc='images') as prog:
+            for image in images:
+                prog.check(results)
+
+                df_image = df.loc[df.filename == image]
+                arr, meta = dataframe_to_numpy(df_image,
+                                               dtype=self.dtype,
+                                               squeeze=False)
+                results[image] = self.converge_landmarks(
+                    arr,
+                    meta,
+                    select_func=select_func,
+                    **{
+                        'bounds': image_bounds(df_image),
+                        **kwargs
+                    })
+
+                prog.update()
+
+        return results
+
+    def _converge_select_mask(self, landmarks: np.ndarray, index: np.ndarray,
+                              mean: np.ndarray, history: History,
+                              select_func: Callable,
+                              settings: dict) -> History:
+        """Eliminate annotators from a mask of the active annotators"""
+
+        mask = np.ones(landmarks.shape[0], dtype=bool)
+
+        while 1:
+            result = converge_mean(landmarks,
+                                   initial_mean=mean,
+                                   mask=mask,
+                                   full_output=True,
+                                   **settings)
+            mean = result.mean
+            _, (inc, exc) = select_landmarks(result.precision,
+                                             landmarks,
+                                             select_func,
+                                             mask=mask)
+
+            history.add(mean, None, index[inc], iterations=result.iterations)
+
+            if len(inc) <= 1:
+                return history
+
+    def _converge_select_incremental(self, landmarks: np.ndarray,
+                                     index: np.ndarray, mean: np.ndarray,
+                                     history: History, select_func: Callable,
+                                     refresh_tol: float,
+                                     settings: dict) -> History:
+        """Eliminate annotators using the incrementally updated mean"""
+
+        engine = IncrementalMean(landmarks,
+                                 refresh_tol=refresh_tol,
+                                 initial_mean=mean,
+                                 **settings)
+
+        while 1:
+            # The mean and the iterations used to converge it are replaced
+            # by the removal
+            mean = engine.mean
+            iterations = engine.last_iterations
+            active = np.flatnonzero(engine.active)
+
+            inc, exc = select_func(engine.precision[active])
+            inc = np.asarray(inc, dtype=int)
+            engine.remove(active[np.asarray(exc, dtype=int)])
+
+            history.add(mean,
+                        None,
+                        index[active[inc]],
+                        iterations=iterations)
+
+            if len(inc) <= 1:
+                return history
@@ -11,26 +11,38 @@ from typing import List, Tuple, Union
 import numpy as np
 import pandas as pd
 
+from johnstondechazal.instrument import timed
+
 
 class History:
-    def __init__(self, meta: pd.DataFrame):
+    def __init__(self,
+                 meta: pd.DataFrame,
+                 dtype: Union[np.dtype, None] = None):
         """
         Class for storing the history of the computations
 
         :param meta: The meta data for the history
         :type meta: pd.DataFrame
+        :param dtype: The type to store the means and landmarks as, defaults
+            to `None` to store them unchanged
+        :type dtype: Union[np.dtype, None], optional
         """
         self.records = {
             'loc': [],
             'included': [],
             'landmarks': [],
+            'iterations': [],
+            'filtered': meta.iloc[[]],
         }
         self.meta = meta.copy()
+        self.dtype = dtype
 
+    @timed('History.add')
     def add(self,
             mean: np.ndarray,
             landmarks: Union[np.ndarray, None],
-            include: Union[List, None] = None) -> None:
+            include: Union[List, None] = None,
+            iterations: int = 0) -> None:
         """Add data to the history record
 
         :param mean: The mean to add to history
@@ -39,9 +51,19 @@ class History:
         :type landmarks: Union[np.ndarray, None]
         :param include: The indices included in the selection
         :type include: Union[List, None]
+        :param iterations: The number of iterations used to converge the
+            mean, defaults to 0
+        :type iterations: int, optional
         """
+        if self.dtype is not None:
+            mean = np.asarray(mean, dtype=self.dtype)
+
+            if landmarks is not None:
+                landmarks = np.asarray(landmarks, dtype=self.dtype)
+
         self.records['loc'].append(mean)
         self.records['landmarks'].append(landmarks)
+        self.records['iterations'].append(iterations)
 
         # Extract the record to be removed
         if include is not None:
@@ -49,6 +71,14 @@ class History:
         else:
             self.records['included'].append(self.meta)
 
+    def add_filtered(self, exclude: List) -> None:
+        """Record the annotators removed before the elimination
+
+        :param exclude: The indices of the removed annotators
+        :type exclude: List
+        """
+        self.records['filtered'] = self.meta.iloc[list(exclude)]
+
     def __iter__(self) -> Tuple[np.ndarray, np.ndarray, pd.DataFrame]:
         """
         """
@@ -88,3 +118,54 @@ class History:
             np.ndarray: The final location
         """
         return self.records['loc'][-1]
+
+    @property
+    def locs(self) -> np.ndarray:
+        """Get the location of every step of the history
+
+        Returns:
+            np.ndarray: The locations with shape `(steps, 2)`
+        """
+        return np.asarray(self.records['loc'])
+
+    @property
+    def filtered(self) -> pd.DataFrame:
+        """Get the annotators removed before the elimination
+
+        Returns:
+            pd.DataFrame: The meta data of the removed annotators
+        """
+        return self.records['filtered']
+
+    @property
+    def iterations(self) -> np.ndarray:
+        """Get the number of iterations used to converge each step
+
+        Returns:
+            np.ndarray: The number of iterations of each step
+        """
+        return np.asarray(self.records['iterations'])
+
+    @property
+    def elimination_order(self) -> pd.DataFrame:
+        """Get the annotators in the order they were removed, starting with
+        the annotators removed before the elimination and ending with the
+        remaining annotators
+
+        Returns:
+            pd.DataFrame: The meta data of the annotators in order of removal
+        """
+        order = list(self.records['filtered'].index)
+        removed = set(order)
+
+        included = self.records['included']
+        for prev, curr in zip(included[:-1], included[1:]):
+            for label in prev.index.difference(curr.index, sort=False):
+                if label not in removed:
+                    order.append(label)
+                    removed.add(label)
+
+        if included:
+            order.extend(included[-1].index)
+
+        return self.meta.loc[order]
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.instrument
+
+Opt-in timers and counters for the hot paths of a ground truth run.  The
+instrumented functions only check whether instrumentation is enabled, so the
+overhead is negligible unless profiling::
+
+    with instrument() as inst:
+        gt.converge_image('i001qa-mn.jpg')
+
+    inst.summary()
+    inst.chrome_trace('trace.json')
+
+"""
+__author__ = 'Ben Johnston'
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, Union
+
+
+class Instrumentation:
+    """Collect the timings and counters of the instrumented functions"""
+    def __init__(self):
+        """Constructor"""
+        self.events = []
+        self.counters = defaultdict(int)
+        self.callbacks = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback: Callable) -> None:
+        """Add a function to call after each timed event
+
+        :param callback: Function with the signature
+            `def func(name: str, duration: float) -> None`, the duration is in
+            seconds
+        :type callback: Callable
+        """
+        self.callbacks.append(callback)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the enclosed block
+
+        :param name: The name of the event
+        :type name: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        """Record a timed event
+
+        :param name: The name of the event
+        :type name: str
+        :param start: The :func:`time.perf_counter` time the event started
+        :type start: float
+        :param duration: The duration of the event in seconds
+        :type duration: float
+        """
+        with self._lock:
+            self.events.append(
+                (name, start - self._origin, duration, threading.get_ident()))
+
+        for callback in self.callbacks:
+            callback(name, duration)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increment a counter
+
+        :param name: The name of the counter
+        :type name: str
+        :param value: The value to add, defaults to 1
+        :type value: int, optional
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self) -> dict:
+        """Summarise the run
+
+        :return: The number of calls, total, mean and maximum duration in
+            seconds of each timed event and the value of each counter
+        :rtype: dict
+        """
+        durations = defaultdict(list)
+        for name, _, duration, _ in self.events:
+            durations[name].append(duration)
+
+        return {
+            'timers': {
+                name: {
+                    'calls': len(values),
+                    'total': sum(values),
+                    'mean': sum(values) / len(values),
+                    'max': max(values),
+                }
+                for name, values in durations.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def chrome_trace(self, path: Union[str, None] = None) -> dict:
+        """Export the timed events in the Chrome trace event format, which
+        can be opened with `chrome://tracing` or Perfetto
+
+        :param path: The file to save the trace to, defaults to `None`
+        :type path: Union[str, None], optional
+        :return: The trace
+        :rtype: dict
+        """
+        pid = os.getpid()
+        trace = {
+            'traceEvents': [{
+                'name': name,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+            } for name, start, duration, tid in self.events],
+        }
+
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(trace, f)
+
+        return trace
+
+
+# The instrumentation of the current run
+_ACTIVE = None
+
+
+def enable(
+    instrumentation: Union[Instrumentation, None] = None
+) -> Instrumentation:
+    """Enable instrumentation
+
+    :param instrumentation: The instrumentation to record to, defaults to
+        `None` for a new instance
+    :type instrumentation: Union[Instrumentation, None], optional
+    :return: The enabled instrumentation
+    :rtype: Instrumentation
+    """
+    global _ACTIVE
+
+    _ACTIVE = Instrumentation() if instrumentation is None else instrumentation
+    return _ACTIVE
+
+
+def disable() -> None:
+    """Disable instrumentation"""
+    global _ACTIVE
+
+    _ACTIVE = None
+
+
+@contextmanager
+def instrument(
+    instrumentation: Union[Instrumentation, None] = None
+) -> Iterator[Instrumentation]:
+    """Enable instrumentation for the enclosed block
+
+    :param instrumentation: The instrumentation to record to, defaults to
+        `None` for a new instance
+    :type instrumentation: Union[Instrumentation, None], optional
+    """
+    global _ACTIVE
+
+    previous = _ACTIVE
+    try:
+        yield enable(instrumentation)
+    finally:
+        _ACTIVE = previous
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing each call of a function while instrumentation is
+    enabled
+
+    :param name: The name of the event
+    :type name: str
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            inst = _ACTIVE
+            if inst is None:
+                return func(*args, **kwargs)
+
+            with inst.timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increment a counter if instrumentation is enabled
+
+    :param name: The name of the counter
+    :type name: str
+    :param value: The value to add, defaults to 1
+    :type value: int, optional
+    """
+    inst = _ACTIVE
+    if inst is not None:
+        inst.count(name, value)
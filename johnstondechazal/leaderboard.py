@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.leaderboard
+
+Quality of each annotator across the whole corpus, aggregated from the
+precision and the elimination order of every landmark of every image.
+
+"""
+__author__ = 'Ben Johnston'
+
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.data import load_all_landmarks
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import BatchSelectResult, converge_select_batch
+from johnstondechazal.shared import corpus_problems, corpus_tensor
+
+
+def elimination_rank(result: BatchSelectResult,
+                     mask: np.ndarray) -> np.ndarray:
+    """Get the step each annotator of each problem was eliminated at,
+    normalised by the number of steps so 0 is eliminated first and 1 is the
+    remaining annotator
+
+    :param result: The result of
+        :func:`~johnstondechazal.method.converge_select_batch`
+    :type result: BatchSelectResult
+    :param mask: The mask of the annotators of each problem
+    :type mask: np.ndarray
+    :return: The rank of each annotator with shape `(problems, annotators)`,
+        NaN for annotators not in a problem and problems with fewer than two
+        annotators
+    :rtype: np.ndarray
+    """
+
+    rank = np.full(mask.shape, np.nan)
+
+    problem, step = np.nonzero(result.eliminated >= 0)
+    rank[problem, result.eliminated[problem, step]] = step
+
+    remaining = mask & np.isnan(rank) & (result.steps > 0)[:, np.newaxis]
+    rank[remaining] = np.broadcast_to(result.steps[:, np.newaxis],
+                                      mask.shape)[remaining]
+
+    return rank / np.maximum(result.steps, 1)[:, np.newaxis]
+
+
+def annotator_leaderboard(
+    gt: FindGrouthTruth,
+    images: Union[Sequence[str], None] = None,
+    type: Union[str, None] = None,
+    iterations: int = 20,
+    tol: float = 1e-4,
+    criterion: str = 'all',
+) -> pd.DataFrame:
+    """Rank the annotators by their elimination order and precision across
+    every landmark of every image
+
+    :param gt: The ground truth finder
+    :type gt: FindGrouthTruth
+    :param images: The selected images, defaults to `None` for all images
+    :type images: Union[Sequence[str], None], optional
+    :param type: The type of annotator to rank, defaults to `None` for all
+        annotators
+    :type type: Union[str, None], optional
+    :param iterations: Number iterations of each convergence, defaults to 20
+    :type iterations: int, optional
+    :param tol: The convergence tolerance, defaults to 1e-4
+    :type tol: float, optional
+    :param criterion: The stopping rule of the convergence, see
+        :func:`~johnstondechazal.method.has_converged`, defaults to 'all'
+    :type criterion: str, optional
+    :return: For each annotator the number of landmarks ranked, the mean and
+        median precision summed over both axes before any annotator is
+        eliminated, the mean and median normalised elimination rank and the
+        proportion of landmarks the annotator was eliminated first and
+        remained last, ordered from best to worst mean rank
+    :rtype: pd.DataFrame
+    """
+
+    df = load_all_landmarks(dirpath=gt.data_dir,
+                            filters=gt.restrict_filters(type, images))
+
+    tensor, meta, _ = corpus_tensor(df, images, dtype=gt.dtype or np.float64)
+    problems, mask = corpus_problems(tensor)
+    del tensor
+
+    result = converge_select_batch(problems,
+                                   mask,
+                                   iterations=iterations,
+                                   tol=tol,
+                                   criterion=criterion)
+    rank = elimination_rank(result, mask)
+
+    problem, annotator = np.nonzero(~np.isnan(rank))
+    ranks = pd.DataFrame({
+        'annotator': annotator,
+        'precision': result.precision[problem, annotator].sum(axis=1),
+        'rank': rank[problem, annotator],
+    })
+    ranks['first'] = ranks['rank'] == 0
+    ranks['last'] = ranks['rank'] == 1
+
+    board = ranks.groupby('annotator').agg(
+        landmarks=('rank', 'size'),
+        mean_precision=('precision', 'mean'),
+        median_precision=('precision', 'median'),
+        mean_rank=('rank', 'mean'),
+        median_rank=('rank', 'median'),
+        eliminated_first=('first', 'mean'),
+        remained_last=('last', 'mean'),
+    )
+
+    board = meta.join(board, how='inner')
+    board = board.sort_values(['mean_rank', 'mean_precision'],
+                              ascending=False)
+
+    return board.reset_index(drop=True)
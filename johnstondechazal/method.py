@@ -8,24 +8,77 @@
 
 __author__ = 'Ben Johnston'
 
-from typing import Callable, Tuple
+from typing import Callable, NamedTuple, Sequence, Tuple, Union
 
 import numpy as np
 
+from johnstondechazal.instrument import count, timed
 
-def annotator_precision(vals: np.ndarray, mean: np.ndarray) -> np.ndarray:
+
+class ConvergeResult(NamedTuple):
+    """The full output of :func:`converge_mean`, or of each problem of
+    :func:`converge_mean_batch`"""
+    mean: np.ndarray
+    precision: np.ndarray
+    iterations: Union[int, np.ndarray]
+    delta: np.ndarray
+    converged: Union[bool, np.ndarray]
+
+
+def _float_dtype(*arrays: np.ndarray) -> np.dtype:
+    """The floating point type used to compute with the arrays, floating point
+    inputs keep their precision and integers are computed in float64"""
+
+    dtype = np.result_type(*arrays)
+    if np.issubdtype(dtype, np.floating):
+        return dtype
+    return np.dtype(np.float64)
+
+
+def annotator_precision(
+        vals: np.ndarray,
+        mean: np.ndarray,
+        mask: Union[np.ndarray, None] = None,
+        out: Union[np.ndarray, None] = None,
+        workspace: Union[np.ndarray, None] = None) -> np.ndarray:
     """Compute annotator precision
 
-    :param vals: Annotator selected landmarks
+    :param vals: Annotator selected landmarks, or the stacked landmarks of a
+        number of problems, see :func:`stack_problems`
     :type vals: np.ndarray
-    :param mean: The current landmark mean
+    :param mean: The current landmark mean, broadcast against `vals`
     :type mean: np.ndarray
+    :param mask: Boolean mask of the active annotators, the precision of
+        inactive annotators is zero, defaults to `None` for all annotators
+    :type mask: Union[np.ndarray, None], optional
+    :param out: Array of the annotator shape `(annotators, 2)`, or
+        `(problems, annotators, 2)`, to store the precision in, defaults to
+        `None` to allocate a new array
+    :type out: Union[np.ndarray, None], optional
+    :param workspace: Scratch array the shape of `vals` used for the
+        intermediate results, defaults to `None` to allocate a new array
+    :type workspace: Union[np.ndarray, None], optional
     :return: The precision of the annotators x, y coordinate selections
     :rtype: np.ndarray
     """
 
-    update = np.sqrt((vals - mean)**2) + np.finfo(float).eps
-    return 1 / update.mean(axis=1)
+    if workspace is None:
+        workspace = np.empty(np.broadcast(vals, mean).shape,
+                             dtype=_float_dtype(vals, mean))
+
+    # |vals - mean| is equivalent to sqrt((vals - mean)**2)
+    np.subtract(vals, mean, out=workspace)
+    np.abs(workspace, out=workspace)
+    workspace += np.finfo(workspace.dtype).eps
+
+    # Average over the replicates
+    out = np.mean(workspace, axis=-2, out=out)
+    np.reciprocal(out, out=out)
+
+    if mask is not None:
+        out *= mask[..., np.newaxis]
+
+    return out
 
 
 def find_worst_sum(precision: np.ndarray) -> Tuple[Tuple[int], Tuple[int]]:
@@ -47,10 +100,45 @@ def find_worst_sum(precision: np.ndarray) -> Tuple[Tuple[int], Tuple[int]]:
     return tuple([tuple(indices), tuple([worst_annot])])
 
 
+def find_worst_partition(
+        precision: np.ndarray,
+        num_exclude: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop the worst performing annotators by summing the precision values
+    for both the x and y directions.  Equivalent to :func:`find_worst_sum`
+    without sorting all of the annotators, the annotators with the lowest
+    precision are found by partial selection and the indices are returned as
+    arrays in their original order.
+
+    :param precision: The annotator precision values
+    :type precision: np.ndarray
+    :param num_exclude: The number of annotators to exclude, defaults to 1
+    :type num_exclude: int, optional
+    :return: The annotators included and the annotators to exclude from the
+        sample
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+
+    precision_sum = precision.sum(axis=1)
+    num_exclude = min(num_exclude, len(precision_sum) - 1)
+
+    if num_exclude == 1:
+        worst_annot = np.array([precision_sum.argmin()])
+    else:
+        worst_annot = np.argpartition(precision_sum,
+                                      num_exclude - 1)[:num_exclude]
+
+    include = np.ones(len(precision_sum), dtype=bool)
+    include[worst_annot] = False
+
+    return np.flatnonzero(include), worst_annot
+
+
+@timed('select_landmarks')
 def select_landmarks(
     precision: np.ndarray,
     landmarks: np.ndarray,
     select_func: Callable = find_worst_sum,
+    mask: Union[np.ndarray, None] = None,
 ) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
     """Select the landmarks for inclusion in final selection.  The landmarks
     are selected from the annotators with the greatest precision values and the
@@ -68,20 +156,201 @@ def select_landmarks(
         `def func(precision: np.ndarray) -> Tuple[Tuple[int], Tuple[int]]`
         where the first element of the resulting tuple contains the indices of
         the included annotators and the second tuple the excluded annotators
+    :param mask: Boolean mask of the active annotators.  If provided the
+        excluded annotators are removed by clearing their entries of the mask
+        in place and the landmarks are returned without being copied, defaults
+        to `None`
+    :type mask: Union[np.ndarray, None], optional
     :return: The landmarks and annotators included and removed from the
         selection
     :rtype: Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]
     """
 
+    if mask is not None:
+        # Inactive annotators can never be the worst
+        _, idx_exclude = select_func(
+            np.where(mask[:, np.newaxis], precision, np.inf))
+        mask[np.asarray(idx_exclude, dtype=int)] = False
+
+        return landmarks, (np.flatnonzero(mask), idx_exclude)
+
     idx_include, idx_exclude = select_func(precision)
     new_landmarks = landmarks[idx_include, ]
 
     return new_landmarks, (idx_include, idx_exclude)
 
 
-def converge_mean(landmarks: np.ndarray,
-                  iterations: int = 20,
-                  tol: float = 1e-4) -> Tuple[np.ndarray, np.ndarray]:
+def prefilter_outliers(landmarks: np.ndarray,
+                       bounds: Union[Tuple[float, float], None] = None,
+                       mad_threshold: Union[float, None] = None,
+                       max_dist: Union[float, None] = None) -> np.ndarray:
+    """Find gross outliers among the annotators in a single vectorised pass,
+    so that they do not need to be eliminated one at a time.
+
+    :param landmarks: The annotator selected landmarks
+    :type landmarks: np.ndarray
+    :param bounds: The width and height of the image, annotators with any
+        selection outside of the image are removed, defaults to `None`
+    :type bounds: Union[Tuple[float, float], None], optional
+    :param mad_threshold: Annotators with a mean selection further from the
+        median of all annotators than `mad_threshold` times the (normally
+        scaled) median absolute deviation in either axis are removed,
+        defaults to `None`
+    :type mad_threshold: Union[float, None], optional
+    :param max_dist: Annotators with a mean selection further than `max_dist`
+        from the median of all annotators are removed, such as the `distLim`
+        of the landmark, defaults to `None`
+    :type max_dist: Union[float, None], optional
+    :return: Boolean mask of the annotators to keep
+    :rtype: np.ndarray
+    """
+
+    keep = np.ones(landmarks.shape[0], dtype=bool)
+
+    if bounds is not None:
+        width, height = bounds
+        x, y = landmarks[..., 0], landmarks[..., 1]
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        keep &= inside.all(axis=1)
+
+    if ((mad_threshold is None) and (max_dist is None)) or (not np.any(keep)):
+        return keep
+
+    replicate_means = landmarks.mean(axis=1)
+    center = np.median(replicate_means[keep], axis=0)
+    deviation = replicate_means - center
+
+    if mad_threshold is not None:
+        mad = 1.4826 * np.median(np.abs(deviation[keep]), axis=0)
+
+        # A zero deviation cannot separate the annotators
+        limit = np.where(mad > 0, mad_threshold * mad, np.inf)
+        keep &= np.all(np.abs(deviation) <= limit, axis=1)
+
+    if max_dist is not None:
+        keep &= np.linalg.norm(deviation, axis=1) <= max_dist
+
+    return keep
+
+
+def initial_estimate(landmarks: np.ndarray,
+                     method: str = 'mean',
+                     subset: Union[np.ndarray, None] = None,
+                     trim: float = 0.1) -> np.ndarray:
+    """Estimate the landmark location to start the convergence from
+
+    :param landmarks: The annotator selected landmarks
+    :type landmarks: np.ndarray
+    :param method: The estimate, one of `mean` for the mean of all
+        selections, `median` for the coordinate-wise median or `trimmed` for
+        the coordinate-wise trimmed mean, defaults to 'mean'
+    :type method: str, optional
+    :param subset: Boolean mask of the annotators to estimate from, such as
+        the expert annotators.  If no annotators are selected all annotators
+        are used, defaults to `None` for all annotators
+    :type subset: Union[np.ndarray, None], optional
+    :param trim: The proportion of the selections removed from each end of
+        each axis by the trimmed mean, defaults to 0.1
+    :type trim: float, optional
+    :return: The initial estimate
+    :rtype: np.ndarray
+    """
+
+    if (subset is not None) and np.any(subset):
+        landmarks = landmarks[subset]
+
+    if method == 'mean':
+        return landmarks.mean(axis=0).mean(axis=0)
+
+    selections = landmarks.reshape((-1, landmarks.shape[-1]))
+
+    if method == 'median':
+        return np.median(selections, axis=0)
+
+    if method == 'trimmed':
+        num_trim = int(trim * selections.shape[0])
+        selections = np.sort(selections, axis=0)
+        return selections[num_trim:selections.shape[0] - num_trim].mean(
+            axis=0)
+
+    raise ValueError(f'Unknown initial estimate: {method}')
+
+
+def resolvable_tol(tol: float,
+                   mean: np.ndarray,
+                   ulps: float = 4) -> Union[float, np.ndarray]:
+    """Raise a convergence tolerance to the resolution of the floating point
+    type of the mean.  A float32 mean of image sized coordinates, e.g. 640
+    pixels, only resolves steps of about 6e-5, so a tolerance of 1e-4 is
+    within rounding noise and the iterations may never stop.
+
+    :param tol: The requested convergence tolerance
+    :type tol: float
+    :param mean: The mean, or the stacked means of a number of problems
+    :type mean: np.ndarray
+    :param ulps: The number of machine epsilons relative to the largest
+        coordinate of the mean the tolerance is raised to, defaults to 4
+    :type ulps: float, optional
+    :return: The tolerance, for each problem if the means are stacked
+    :rtype: Union[float, np.ndarray]
+    """
+
+    eps = np.finfo(_float_dtype(mean)).eps
+    return np.maximum(tol, ulps * eps * np.abs(mean).max(axis=-1))
+
+
+def has_converged(delta: np.ndarray,
+                  tol: Union[float, np.ndarray],
+                  criterion: str = 'all',
+                  axis: Union[int, None] = None) -> Union[bool, np.ndarray]:
+    """Check the stopping rule of the convergence
+
+    :param delta: The change in mean position of each axis
+    :type delta: np.ndarray
+    :param tol: The convergence tolerance, or the tolerance of each problem
+        if `axis` is given
+    :type tol: Union[float, np.ndarray]
+    :param criterion: `all` if every axis must change by less than `tol`,
+        `any` if any axis must change by less than `tol` or `norm` if the
+        euclidean distance moved must be less than `tol`, defaults to 'all'
+    :type criterion: str, optional
+    :param axis: The axis of the coordinates of the stacked changes of a
+        number of problems, defaults to `None` for a single problem
+    :type axis: Union[int, None], optional
+    :return: If the mean has converged, for each problem if `axis` is given
+    :rtype: Union[bool, np.ndarray]
+    """
+
+    if axis is not None:
+        tol = np.expand_dims(tol, axis)
+
+    if criterion == 'all':
+        converged = np.all(delta < tol, axis=axis)
+    elif criterion == 'any':
+        converged = np.any(delta < tol, axis=axis)
+    elif criterion == 'norm':
+        dist = np.linalg.norm(delta, axis=axis, keepdims=True)
+        converged = np.all(dist < tol, axis=axis)
+    else:
+        raise ValueError(f'Unknown convergence criterion: {criterion}')
+
+    if axis is None:
+        return bool(converged)
+
+    return converged
+
+
+@timed('converge_mean')
+def converge_mean(
+    landmarks: np.ndarray,
+    iterations: int = 20,
+    tol: float = 1e-4,
+    initial_mean: Union[np.ndarray, None] = None,
+    mask: Union[np.ndarray, None] = None,
+    init: str = 'mean',
+    criterion: str = 'all',
+    full_output: bool = False,
+) -> Union[Tuple[np.ndarray, np.ndarray], ConvergeResult]:
     """Converge upon an estimate of the global mean, computed as a weighted mean of
     annotator precision.
 
@@ -90,33 +359,435 @@ def converge_mean(landmarks: np.ndarray,
     :param iterations: Number iterations to execute, defaults to 20
     :type iterations: int, optional
     :param tol: If changes in mean position are less than the specified
-        value convergence terminates, defaults to 1e-4
+        value convergence terminates.  The tolerance is raised to the
+        resolution of the floating point type, see :func:`resolvable_tol`,
+        defaults to 1e-4
     :type tol: float, optional
+    :param initial_mean: The mean to start the iterations from, such as the
+        converged mean of a previous elimination step, defaults to `None` to
+        use the estimate selected by `init`
+    :type initial_mean: Union[np.ndarray, None], optional
+    :param mask: Boolean mask of the annotators to include in the mean,
+        defaults to `None` for all annotators
+    :type mask: Union[np.ndarray, None], optional
+    :param init: The estimate to start from if no `initial_mean` is
+        provided, see :func:`initial_estimate`, defaults to 'mean' for the
+        unweighted mean of all annotators
+    :type init: str, optional
+    :param criterion: How the change in mean position of each axis is
+        compared to `tol`, see :func:`has_converged`, defaults to 'all'
+    :type criterion: str, optional
+    :param full_output: Return a :class:`ConvergeResult` including the number
+        of iterations used and the final change in mean position, defaults to
+        `False`
+    :type full_output: bool, optional
     :return: The converged global mean and the corresponding annotator
         precision values
-    :rtype: Tuple[np.ndarray, np.ndarray]
+    :rtype: Union[Tuple[np.ndarray, np.ndarray], ConvergeResult]
+
+    The computation is performed in the floating point type of `landmarks`,
+    integer landmarks are computed in float64.  For image sized coordinates
+    the means converged from float32 landmarks typically differ from the
+    float64 result by less than 1e-3 pixels and by less than 0.02 pixels at
+    most.  In float32 the default tolerance is below the resolution of image
+    sized coordinates and is raised to about 3e-4 pixels for coordinates near
+    640, so float32 convergence stops in as many iterations as float64.
     """
 
-    global_mean = landmarks.mean(axis=0).mean(axis=0)
+    if initial_mean is None:
+        global_mean = initial_estimate(landmarks, init, subset=mask)
+    else:
+        global_mean = np.asarray(initial_mean)
+
+    tol = resolvable_tol(tol, global_mean)
 
     # Fake the size of the previous mean for the first iteration
     prev_mean = np.inf * global_mean
 
+    # Buffers reused by each iteration
+    replicate_means = landmarks.mean(axis=1)
+    workspace = np.empty(landmarks.shape, dtype=replicate_means.dtype)
+    precision = np.empty(replicate_means.shape, dtype=replicate_means.dtype)
+
     for idx in range(iterations):
 
-        precision = annotator_precision(landmarks, global_mean)
-        weights = precision / precision.sum(axis=0)
+        precision = annotator_precision(landmarks,
+                                        global_mean,
+                                        mask=mask,
+                                        out=precision,
+                                        workspace=workspace)
 
-        global_mean = np.array([
-            np.average(landmarks[:, :, 0].mean(axis=1), weights=weights[:, 0]),
-            np.average(landmarks[:, :, 1].mean(axis=1), weights=weights[:, 1]),
-        ])
+        global_mean = np.average(replicate_means, weights=precision, axis=0)
 
-        # # Check stop condition
-        stop = np.abs(global_mean - prev_mean)
-        if np.any(stop < tol):
-            return global_mean, precision
+        # Check stop condition
+        delta = np.abs(global_mean - prev_mean)
+        converged = has_converged(delta, tol, criterion)
+        if converged:
+            break
 
         prev_mean = np.copy(global_mean)
 
+    count('converge_mean.iterations', idx + 1)
+
+    if full_output:
+        return ConvergeResult(global_mean, precision, idx + 1, delta,
+                              converged)
+
     return global_mean, precision
+
+
+class IncrementalMean:
+    """Maintain the precision weighted mean of a set of annotators while
+    annotators are removed one at a time.
+
+    The running sums of the annotator weights and the weighted replicate means
+    are kept for each axis, so removing an annotator only subtracts its
+    contribution.  The annotator weights are held at the values computed for
+    the last fully converged mean and the full iterations of
+    :func:`converge_mean` are only repeated once the mean has moved further
+    than `refresh_tol` from that mean.
+    """
+    def __init__(self,
+                 landmarks: np.ndarray,
+                 iterations: int = 20,
+                 tol: float = 1e-4,
+                 refresh_tol: float = 1e-2,
+                 initial_mean: Union[np.ndarray, None] = None,
+                 criterion: str = 'all'):
+        """Constructor
+
+        :param landmarks: The annotator selected landmarks
+        :type landmarks: np.ndarray
+        :param iterations: Number iterations to execute for each full
+            convergence, defaults to 20
+        :type iterations: int, optional
+        :param tol: The convergence tolerance of :func:`converge_mean`,
+            defaults to 1e-4
+        :type tol: float, optional
+        :param refresh_tol: The change in mean position beyond which the
+            annotator weights are recomputed, defaults to 1e-2
+        :type refresh_tol: float, optional
+        :param initial_mean: The mean to start the first convergence from,
+            defaults to `None` for the unweighted mean of all annotators
+        :type initial_mean: Union[np.ndarray, None], optional
+        :param criterion: The stopping rule of :func:`converge_mean`,
+            defaults to 'all'
+        :type criterion: str, optional
+        """
+
+        self.landmarks = landmarks
+        self.iterations = iterations
+        self.tol = tol
+        self.refresh_tol = refresh_tol
+        self.criterion = criterion
+
+        self.replicate_means = landmarks.mean(axis=1)
+        self.active = np.ones(landmarks.shape[0], dtype=bool)
+        self.precision = np.zeros(self.replicate_means.shape,
+                                  dtype=self.replicate_means.dtype)
+        self.refreshes = 0
+
+        # The iterations used to converge the current mean, 0 if it was
+        # updated incrementally
+        self.last_iterations = 0
+
+        self.refresh(initial_mean)
+
+    def refresh(self, initial_mean: Union[np.ndarray, None] = None) -> None:
+        """Converge the mean of the active annotators and reset the running
+        sums
+
+        :param initial_mean: The mean to start the iterations from, defaults
+            to `None`
+        :type initial_mean: Union[np.ndarray, None], optional
+        """
+
+        idx = np.flatnonzero(self.active)
+        result = converge_mean(self.landmarks[idx],
+                               iterations=self.iterations,
+                               tol=self.tol,
+                               initial_mean=initial_mean,
+                               criterion=self.criterion,
+                               full_output=True)
+        mean, precision = result.mean, result.precision
+
+        self.precision[:] = 0
+        self.precision[idx] = precision
+
+        self._weight_sum = precision.sum(axis=0)
+        self._weighted_sum = (precision *
+                              self.replicate_means[idx]).sum(axis=0)
+
+        self.anchor = mean
+        self.mean = mean
+        self.refreshes += 1
+        self.last_iterations = result.iterations
+
+    def remove(self, indices: Union[int, np.ndarray]) -> np.ndarray:
+        """Remove annotators from the mean
+
+        :param indices: The indices of the annotators to remove
+        :type indices: Union[int, np.ndarray]
+        :return: The updated mean
+        :rtype: np.ndarray
+        """
+
+        indices = np.atleast_1d(indices)
+        weights = self.precision[indices]
+
+        self._weight_sum = self._weight_sum - weights.sum(axis=0)
+        self._weighted_sum = self._weighted_sum - (
+            weights * self.replicate_means[indices]).sum(axis=0)
+
+        self.precision[indices] = 0
+        self.active[indices] = False
+
+        self.mean = self._weighted_sum / self._weight_sum
+        self.last_iterations = 0
+
+        if np.any(np.abs(self.mean - self.anchor) > self.refresh_tol):
+            self.refresh(initial_mean=self.mean)
+
+        return self.mean
+
+
+class BatchSelectResult(NamedTuple):
+    """The output of :func:`converge_select_batch`, steps are padded with NaN
+    means and -1 annotators once a problem has a single annotator left"""
+    means: np.ndarray
+    eliminated: np.ndarray
+    iterations: np.ndarray
+    steps: np.ndarray
+    precision: np.ndarray
+
+
+def stack_problems(
+        problems: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack a number of landmark sets, e.g. each landmark of each image,
+    padded to a common number of annotators
+
+    :param problems: The landmark sets, each with shape `(annotators,
+        replicates, 2)`
+    :type problems: Sequence[np.ndarray]
+    :return: The stacked landmarks with shape `(problems, annotators,
+        replicates, 2)` and the boolean mask of the annotators of each problem
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+
+    num_annotators = max(len(x) for x in problems)
+    shape = (len(problems), num_annotators) + problems[0].shape[1:]
+
+    landmarks = np.zeros(shape, dtype=_float_dtype(*problems))
+    mask = np.zeros(shape[:2], dtype=bool)
+
+    for idx, problem in enumerate(problems):
+        landmarks[idx, :len(problem)] = problem
+        mask[idx, :len(problem)] = True
+
+    return landmarks, mask
+
+
+def _converge_mean_batch(landmarks: np.ndarray, replicate_means: np.ndarray,
+                         mask: np.ndarray, iterations: int, tol: float,
+                         initial_mean: Union[np.ndarray, None],
+                         criterion: str) -> ConvergeResult:
+    """Converge the mean of a stack of problems whose padded annotators are
+    zero, see :func:`converge_mean_batch`"""
+
+    dtype = replicate_means.dtype
+    num_problems = landmarks.shape[0]
+
+    if initial_mean is None:
+        mean = replicate_means.sum(axis=1) / mask.sum(
+            axis=1, dtype=dtype)[:, np.newaxis]
+    else:
+        mean = np.array(initial_mean, dtype=dtype)
+
+    tols = resolvable_tol(tol, mean)
+
+    final_mean = np.empty(mean.shape, dtype=dtype)
+    precision = np.zeros(replicate_means.shape, dtype=dtype)
+    delta = np.full(mean.shape, np.inf, dtype=dtype)
+    num_iterations = np.zeros(num_problems, dtype=int)
+    converged = np.zeros(num_problems, dtype=bool)
+
+    # Buffers reused by each iteration, the leading rows hold the problems
+    # still iterating
+    workspace = np.empty(landmarks.shape, dtype=dtype)
+    prec_buf = np.empty(replicate_means.shape, dtype=dtype)
+    weighted_buf = np.empty(replicate_means.shape, dtype=dtype)
+
+    # The problems still iterating, only compacted once problems finish
+    active = np.arange(num_problems)
+    step_delta = delta
+
+    for idx in range(iterations):
+        num_active = len(active)
+        prec = annotator_precision(landmarks,
+                                   mean[:, np.newaxis, np.newaxis],
+                                   mask=mask,
+                                   out=prec_buf[:num_active],
+                                   workspace=workspace[:num_active])
+
+        weighted = np.multiply(replicate_means,
+                               prec,
+                               out=weighted_buf[:num_active])
+        new_mean = weighted.sum(axis=1) / prec.sum(axis=1)
+
+        # As converge_mean, the first iteration never stops the convergence
+        if idx:
+            step_delta = np.abs(new_mean - mean)
+        mean = new_mean
+
+        done = has_converged(step_delta, tols, criterion, axis=-1)
+        finished = done | (idx == iterations - 1)
+
+        if finished.any():
+            rows = active[finished]
+            final_mean[rows] = mean[finished]
+            precision[rows] = prec[finished]
+            delta[rows] = step_delta[finished]
+            num_iterations[rows] = idx + 1
+            converged[rows] = done[finished]
+
+            keep = ~finished
+            active = active[keep]
+            landmarks, replicate_means = landmarks[keep], replicate_means[keep]
+            mask, tols = mask[keep], tols[keep]
+            mean, step_delta = mean[keep], step_delta[keep]
+
+        if not len(active):
+            break
+
+    count('converge_mean_batch.iterations', int(num_iterations.sum()))
+
+    return ConvergeResult(final_mean, precision, num_iterations, delta,
+                          converged)
+
+
+@timed('converge_mean_batch')
+def converge_mean_batch(landmarks: np.ndarray,
+                        mask: Union[np.ndarray, None] = None,
+                        iterations: int = 20,
+                        tol: float = 1e-4,
+                        initial_mean: Union[np.ndarray, None] = None,
+                        criterion: str = 'all') -> ConvergeResult:
+    """Converge the mean of a stack of independent problems at once, see
+    :func:`converge_mean`.  Each problem stops iterating once it has
+    converged, so the results match converging the problems separately.
+
+    :param landmarks: The stacked annotator selected landmarks with shape
+        `(problems, annotators, replicates, 2)`, see :func:`stack_problems`
+    :type landmarks: np.ndarray
+    :param mask: Boolean mask of the annotators included in each problem with
+        shape `(problems, annotators)`, defaults to `None` for all annotators
+    :type mask: Union[np.ndarray, None], optional
+    :param iterations: Number iterations to execute, defaults to 20
+    :type iterations: int, optional
+    :param tol: If changes in mean position are less than the specified
+        value convergence terminates.  The tolerance of each problem is
+        raised to the resolution of the floating point type, see
+        :func:`resolvable_tol`, defaults to 1e-4
+    :type tol: float, optional
+    :param initial_mean: The mean of each problem to start from, defaults to
+        `None` for the unweighted mean of the included annotators
+    :type initial_mean: Union[np.ndarray, None], optional
+    :param criterion: How the change in mean position of each axis is
+        compared to `tol`, see :func:`has_converged`, defaults to 'all'
+    :type criterion: str, optional
+    :return: The mean, precision, iterations, change in mean position and
+        whether each problem converged
+    :rtype: ConvergeResult
+    """
+
+    if mask is None:
+        mask = np.ones(landmarks.shape[:2], dtype=bool)
+
+    # Padded annotators may be NaN
+    landmarks = np.where(mask[:, :, np.newaxis, np.newaxis], landmarks,
+                         0).astype(_float_dtype(landmarks), copy=False)
+
+    return _converge_mean_batch(landmarks, landmarks.mean(axis=2), mask,
+                                iterations, tol, initial_mean, criterion)
+
+
+@timed('converge_select_batch')
+def converge_select_batch(landmarks: np.ndarray,
+                          mask: Union[np.ndarray, None] = None,
+                          iterations: int = 20,
+                          tol: float = 1e-4,
+                          criterion: str = 'all') -> BatchSelectResult:
+    """Eliminate the annotators of a stack of independent problems at once.
+    Each step converges the mean of every problem with two or more annotators
+    left and removes the annotator with the lowest precision, as
+    :func:`find_worst_partition`, warm starting from the mean of the previous
+    step.
+
+    :param landmarks: The stacked annotator selected landmarks with shape
+        `(problems, annotators, replicates, 2)`, see :func:`stack_problems`
+    :type landmarks: np.ndarray
+    :param mask: Boolean mask of the annotators included in each problem with
+        shape `(problems, annotators)`, defaults to `None` for all annotators
+    :type mask: Union[np.ndarray, None], optional
+    :param iterations: Number iterations of each convergence, defaults to 20
+    :type iterations: int, optional
+    :param tol: The convergence tolerance, defaults to 1e-4
+    :type tol: float, optional
+    :param criterion: The stopping rule of the convergence, see
+        :func:`has_converged`, defaults to 'all'
+    :type criterion: str, optional
+    :return: The converged mean, eliminated annotator and iterations of each
+        step of each problem, the number of steps of each problem and the
+        precision of the annotators of the first step, before any are
+        eliminated
+    :rtype: BatchSelectResult
+    """
+
+    if mask is None:
+        mask = np.ones(landmarks.shape[:2], dtype=bool)
+
+    dtype = _float_dtype(landmarks)
+    num_problems, num_annotators = mask.shape
+    num_steps = max(int(mask.sum(axis=1).max(initial=0)) - 1, 0)
+
+    means = np.full((num_problems, num_steps, 2), np.nan, dtype=dtype)
+    eliminated = np.full((num_problems, num_steps), -1, dtype=int)
+    num_iterations = np.zeros((num_problems, num_steps), dtype=int)
+    precision = np.zeros(landmarks.shape[:2] + (2, ), dtype=dtype)
+
+    # A single zero padded copy of the problems, only compacted once problems
+    # have a single annotator left
+    mask = mask.copy()
+    landmarks = np.where(mask[:, :, np.newaxis, np.newaxis], landmarks,
+                         0).astype(dtype, copy=False)
+    replicate_means = landmarks.mean(axis=2)
+    active = np.arange(num_problems)
+    mean = None
+
+    for step in range(num_steps):
+        # The problems with annotators left to eliminate
+        keep = mask.sum(axis=1) > 1
+        if not keep.all():
+            active = active[keep]
+            landmarks, replicate_means = landmarks[keep], replicate_means[keep]
+            mask = mask[keep]
+            mean = None if mean is None else mean[keep]
+
+        result = _converge_mean_batch(landmarks, replicate_means, mask,
+                                      iterations, tol, mean, criterion)
+        mean = result.mean
+
+        if not step:
+            precision[active] = result.precision
+
+        # Inactive annotators can never be the worst
+        precision_sum = np.where(mask, result.precision.sum(axis=2), np.inf)
+        worst = precision_sum.argmin(axis=1)
+        mask[np.arange(len(active)), worst] = False
+
+        means[active, step] = mean
+        eliminated[active, step] = worst
+        num_iterations[active, step] = result.iterations
+
+    return BatchSelectResult(means, eliminated, num_iterations,
+                             (eliminated >= 0).sum(axis=1), precision)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.progress
+
+Progress reporting and cooperative cancellation of long running jobs
+
+"""
+__author__ = 'Ben Johnston'
+
+import threading
+from typing import Any, Callable, Union
+
+from tqdm import tqdm
+
+
+class Cancelled(Exception):
+    """Raised when a job is cancelled, the results completed before the
+    cancellation are available as `partial`"""
+    def __init__(self, partial: Any = None):
+        """Constructor
+
+        :param partial: The results completed before the cancellation,
+            defaults to `None`
+        :type partial: Any, optional
+        """
+        super().__init__('The job was cancelled')
+        self.partial = partial
+
+
+class CancellationToken:
+    """Token used to request the cancellation of a job, e.g. from another
+    thread or a signal handler"""
+    def __init__(self):
+        """Constructor"""
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Request the cancellation of the job"""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Get if the cancellation has been requested
+
+        Returns:
+            bool: If the job is cancelled
+        """
+        return self._event.is_set()
+
+
+class Progress:
+    """Report the progress of a job and check for cancellation"""
+    def __init__(self,
+                 total: Union[int, None] = None,
+                 progress: Union[Callable, bool, None] = None,
+                 cancel: Union[CancellationToken, None] = None,
+                 desc: Union[str, None] = None):
+        """Constructor
+
+        :param total: The total amount of work, defaults to `None` if unknown
+        :type total: Union[int, None], optional
+        :param progress: Either a function with the signature
+            `def func(done: int, total: Union[int, None]) -> None` called as
+            work completes, `True` to display a tqdm progress bar or `None` to
+            not report progress, defaults to `None`
+        :type progress: Union[Callable, bool, None], optional
+        :param cancel: The token used to cancel the job, defaults to `None`
+        :type cancel: Union[CancellationToken, None], optional
+        :param desc: The description of the progress bar, defaults to `None`
+        :type desc: Union[str, None], optional
+        """
+        self.total = total
+        self.done = 0
+        self.cancel = cancel
+
+        self._callback = progress if callable(progress) else None
+        self._bar = tqdm(total=total, desc=desc) if progress is True else None
+
+    def set_total(self, total: Union[int, None]) -> None:
+        """Set the total amount of work once it is known
+
+        :param total: The total amount of work
+        :type total: Union[int, None]
+        """
+        self.total = total
+
+        if self._bar is not None:
+            self._bar.total = total
+            self._bar.refresh()
+
+    def update(self, num: int = 1) -> None:
+        """Report completed work
+
+        :param num: The amount of work completed, defaults to 1
+        :type num: int, optional
+        """
+        self.done += num
+
+        if self._callback is not None:
+            self._callback(self.done, self.total)
+
+        if self._bar is not None:
+            self._bar.update(num)
+
+    def check(self, partial: Any = None) -> None:
+        """Raise :class:`Cancelled` if the job has been cancelled
+
+        :param partial: The results completed so far, defaults to `None`
+        :type partial: Any, optional
+        """
+        if (self.cancel is not None) and self.cancel.cancelled:
+            self.close()
+            raise Cancelled(partial)
+
+    def close(self) -> None:
+        """Close the progress bar"""
+        if self._bar is not None:
+            self._bar.close()
+            self._bar = None
+
+    def __enter__(self) -> 'Progress':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.server
+
+Local query server of ground truth results.  The corpus is loaded once and
+held in memory, and each query of `(image, landmark, type)` is answered by
+:meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select` with the
+results cached between queries::
+
+    GET /groundtruth?image=i001qa-mn.jpg&landmark=1&type=expert
+
+The server listens on a TCP port or a Unix socket.
+
+"""
+__author__ = 'Ben Johnston'
+
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.cache import ResultCache
+from johnstondechazal.data import dataframe_to_numpy, load_all_landmarks
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import find_worst_partition, find_worst_sum
+
+SELECT_FUNCS = {
+    'partition': find_worst_partition,
+    'sum': find_worst_sum,
+}
+
+
+class QueryError(ValueError):
+    """Raised for an invalid query"""
+
+
+class GroundTruthService:
+    """The corpus held in memory and the queries answered with it"""
+    def __init__(self, gt: FindGrouthTruth):
+        """Constructor
+
+        :param gt: The ground truth finder, a
+            :class:`~johnstondechazal.cache.ResultCache` is added if it does
+            not have a cache
+        :type gt: FindGrouthTruth
+        """
+        self.gt = gt
+        if gt.cache is None:
+            gt.cache = ResultCache()
+
+        self.df = load_all_landmarks(dirpath=gt.data_dir,
+                                     filters=gt.filters)
+        self.images = sorted(self.df.filename.unique())
+        self.landmarks = sorted(x for x in self.df.columns
+                                if isinstance(x, int))
+
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def arrays(self, image: str,
+               type: Union[str, None]) -> Tuple[np.ndarray, pd.DataFrame]:
+        """Get the landmarks and meta data of an image, converting the corpus
+        once for each image and type
+
+        :param image: The selected image
+        :type image: str
+        :param type: The type of annotator selected
+        :type type: Union[str, None]
+        :return: The landmarks and meta data
+        :rtype: Tuple[np.ndarray, pd.DataFrame]
+        """
+        key = (image, type)
+
+        with self._lock:
+            if key not in self._arrays:
+                df = self.df.loc[self.df.filename == image]
+                if type is not None:
+                    df = df.loc[df.type == type]
+
+                if df.empty:
+                    raise QueryError(f'No landmarks of image {image!r} '
+                                     f'and type {type!r}')
+
+                self._arrays[key] = dataframe_to_numpy(df,
+                                                       dtype=self.gt.dtype,
+                                                       squeeze=False)
+
+            return self._arrays[key]
+
+    def query(self,
+              image: str,
+              landmark: int,
+              type: Union[str, None] = None,
+              select: str = 'partition') -> dict:
+        """Compute the ground truth of a landmark of an image
+
+        :param image: The selected image
+        :type image: str
+        :param landmark: The landmark ID
+        :type landmark: int
+        :param type: The type of annotator selected, defaults to `None`
+        :type type: Union[str, None], optional
+        :param select: The name of the select function, see
+            :data:`SELECT_FUNCS`, defaults to 'partition'
+        :type select: str, optional
+        :raises QueryError: If the query is invalid
+        :return: The final location, elimination order and iterations
+        :rtype: dict
+        """
+        if landmark not in self.landmarks:
+            raise QueryError(f'Unknown landmark {landmark!r}')
+
+        if select not in SELECT_FUNCS:
+            raise QueryError(f'Unknown select function {select!r}')
+
+        landmarks, meta = self.arrays(image, type)
+        history = self.gt.converge_select(
+            landmarks[:, :, self.landmarks.index(landmark)],
+            meta,
+            select_func=SELECT_FUNCS[select])
+
+        return {
+            'image': image,
+            'landmark': landmark,
+            'type': type,
+            'select': select,
+            'loc': [float(x) for x in history.loc],
+            'elimination_order':
+            [str(x) for x in history.elimination_order.workerid],
+            'iterations': int(history.iterations.sum()),
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Answer the queries of a :class:`GroundTruthService`"""
+
+    service = None
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {key: val[-1] for key, val in parse_qs(url.query).items()}
+
+        try:
+            if url.path == '/health':
+                self._send(200, {'status': 'ok'})
+            elif url.path == '/images':
+                self._send(200, {'images': self.service.images})
+            elif url.path == '/groundtruth':
+                self._send(200, self._query(params))
+            else:
+                self._send(404, {'error': f'Unknown path {url.path!r}'})
+        except QueryError as err:
+            self._send(400, {'error': str(err)})
+        except Exception as err:
+            # Always answer the client rather than dropping the connection
+            self.log_error('Query %r failed: %r', self.path, err)
+            self._send(500, {'error': f'{type(err).__name__}: {err}'})
+
+    def _query(self, params: dict) -> dict:
+        try:
+            image = params['image']
+            landmark = int(params['landmark'])
+        except (KeyError, ValueError):
+            raise QueryError('image and an integer landmark are required')
+
+        return self.service.query(image,
+                                  landmark,
+                                  type=params.get('type'),
+                                  select=params.get('select', 'partition'))
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # The client address of a Unix socket is not a (host, port) pair
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    """HTTP server listening on a Unix socket"""
+
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def make_server(gt: FindGrouthTruth,
+                host: str = '127.0.0.1',
+                port: int = 8000,
+                unix_socket: Union[str, None] = None,
+                quiet: bool = False) -> socketserver.BaseServer:
+    """Load the corpus and create the query server, start serving with
+    `serve_forever`
+
+    :param gt: The ground truth finder
+    :type gt: FindGrouthTruth
+    :param host: The host to listen on, defaults to '127.0.0.1'
+    :type host: str, optional
+    :param port: The port to listen on, 0 for any free port, defaults to 8000
+    :type port: int, optional
+    :param unix_socket: The path of a Unix socket to listen on instead of a
+        TCP port, defaults to `None`
+    :type unix_socket: Union[str, None], optional
+    :param quiet: Do not log the requests, defaults to `False`
+    :type quiet: bool, optional
+    :return: The server
+    :rtype: socketserver.BaseServer
+    """
+    handler = type('Handler', (QueryHandler, ),
+                   {'service': GroundTruthService(gt)})
+
+    if unix_socket is not None:
+        server = UnixHTTPServer(unix_socket, handler)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+
+    server.quiet = quiet
+    return server
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+.. currentmodule:: johnstondechazal.shared
+
+The landmark corpus as a single `(images, annotators, replicates, landmarks,
+2)` tensor published in shared memory.  Worker processes attach to the tensor
+once when they start and compute the ground truth of each image from a view
+of the tensor, instead of parsing the landmarks or receiving a pickled copy
+with every task.
+
+"""
+__author__ = 'Ben Johnston'
+
+from collections import defaultdict
+from multiprocessing import Pool, shared_memory
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from johnstondechazal.data import load_all_landmarks
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.history import History
+from johnstondechazal.method import find_worst_partition
+
+
+def corpus_tensor(
+    df: pd.DataFrame,
+    images: Union[Sequence[str], None] = None,
+    dtype: np.dtype = np.float64
+) -> Tuple[np.ndarray, pd.DataFrame, List[str]]:
+    """Convert the landmarks of a number of images to a single tensor
+
+    :param df: The landmarks, see
+        :func:`~johnstondechazal.data.load_all_landmarks`
+    :type df: pd.DataFrame
+    :param images: The selected images, defaults to `None` for all images
+    :type images: Union[Sequence[str], None], optional
+    :param dtype: The floating point type of the tensor, defaults to
+        `np.float64`
+    :type dtype: np.dtype, optional
+    :return: The tensor with shape `(images, annotators, replicates,
+        landmarks, 2)`, the metadata of the annotators and the images.  The
+        replicates an annotator did not provide are NaN.
+    :rtype: Tuple[np.ndarray, pd.DataFrame, List[str]]
+    """
+
+    if images is None:
+        images = sorted(df.filename.unique())
+
+    images = list(images)
+    df = df.loc[df.filename.isin(images)]
+
+    cols = sorted(x for x in df.columns if isinstance(x, int))
+    meta = df.drop_duplicates('workerid').sort_values('workerid')
+    meta = meta[['workerid', 'type']].reset_index(drop=True)
+
+    image_idx = {image: idx for idx, image in enumerate(images)}
+    worker_idx = {worker: idx for idx, worker in enumerate(meta.workerid)}
+    replicates = df.groupby(['filename', 'workerid']).size().max() \
+        if len(df) else 0
+
+    tensor = np.full((len(images), len(meta), replicates, len(cols), 2),
+                     np.nan,
+                     dtype=dtype)
+
+    coords = np.array(df[cols].values.tolist(), dtype=dtype)
+    counts = defaultdict(int)
+    for row, (image, worker) in enumerate(zip(df.filename, df.workerid)):
+        key = (image_idx[image], worker_idx[worker])
+        tensor[key + (counts[key], )] = coords[row]
+        counts[key] += 1
+
+    return tensor, meta, images
+
+
+def corpus_problems(tensor: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Reshape a corpus tensor to a stack of the landmark sets of each image
+    and landmark, see :func:`~johnstondechazal.method.converge_mean_batch`
+
+    :param tensor: The tensor with shape `(images, annotators, replicates,
+        landmarks, 2)`, see :func:`corpus_tensor`
+    :type tensor: np.ndarray
+    :return: The landmarks with shape `(images * landmarks, annotators,
+        replicates, 2)` ordered by image then landmark, and the mask of the
+        annotators that provided every replicate of each problem
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+
+    num_images, num_annotators, num_replicates, num_landmarks, _ = tensor.shape
+
+    problems = tensor.transpose(0, 3, 1, 2, 4).reshape(
+        (num_images * num_landmarks, num_annotators, num_replicates, 2))
+    mask = ~np.isnan(problems).any(axis=(2, 3))
+
+    return problems, mask
+
+
+class SharedCorpus:
+    """Landmark tensor held in shared memory"""
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple,
+                 dtype: np.dtype, meta: pd.DataFrame, images: Sequence[str],
+                 owner: bool):
+        """Constructor, see :meth:`publish` and :meth:`attach`"""
+        self.shm = shm
+        self.tensor = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        self.meta = meta
+        self.images = list(images)
+        self.owner = owner
+
+    @classmethod
+    def publish(cls, tensor: np.ndarray, meta: pd.DataFrame,
+                images: Sequence[str]) -> 'SharedCorpus':
+        """Copy a tensor into a new block of shared memory
+
+        :param tensor: The tensor, see :func:`corpus_tensor`
+        :type tensor: np.ndarray
+        :param meta: The metadata of the annotators
+        :type meta: pd.DataFrame
+        :param images: The images
+        :type images: Sequence[str]
+        :return: The shared corpus, which owns the shared memory
+        :rtype: SharedCorpus
+        """
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(tensor.nbytes, 1))
+        corpus = cls(shm, tensor.shape, tensor.dtype, meta, images, True)
+        corpus.tensor[...] = tensor
+
+        return corpus
+
+    @classmethod
+    def attach(cls, spec: dict) -> 'SharedCorpus':
+        """Attach to a published tensor without copying it
+
+        :param spec: The description of the published tensor, see
+            :attr:`spec`
+        :type spec: dict
+        :return: The shared corpus
+        :rtype: SharedCorpus
+        """
+        # The worker processes share the resource tracker of the owner, which
+        # unlinks the shared memory
+        shm = shared_memory.SharedMemory(name=spec['name'])
+
+        return cls(shm, spec['shape'], np.dtype(spec['dtype']), spec['meta'],
+                   spec['images'], False)
+
+    @property
+    def spec(self) -> dict:
+        """Get the picklable description of the tensor used to attach to it
+
+        Returns:
+            dict: The name of the shared memory, the shape and type of the
+                tensor, the metadata and the images
+        """
+        return {
+            'name': self.shm.name,
+            'shape': self.tensor.shape,
+            'dtype': self.tensor.dtype.str,
+            'meta': self.meta,
+            'images': self.images,
+        }
+
+    def image(
+        self,
+        image: Union[str, int],
+        type: Union[str, None] = None
+    ) -> Tuple[np.ndarray, pd.DataFrame]:
+        """Get the landmarks and metadata of an image.  The landmarks are a
+        view of the shared tensor if every annotator provided every replicate,
+        otherwise the incomplete annotators are removed.
+
+        :param image: The image or the index of the image
+        :type image: Union[str, int]
+        :param type: The type of annotator to select, defaults to `None` for
+            all annotators
+        :type type: Union[str, None], optional
+        :return: The landmarks with shape `(annotators, replicates, landmarks,
+            2)` and the metadata
+        :rtype: Tuple[np.ndarray, pd.DataFrame]
+        """
+        if isinstance(image, str):
+            image = self.images.index(image)
+
+        landmarks = self.tensor[image]
+        select = ~np.isnan(landmarks).any(axis=(1, 2, 3))
+
+        if type is not None:
+            select &= (self.meta.type == type).values
+
+        if select.all():
+            return landmarks, self.meta
+
+        return landmarks[select], self.meta.loc[select].reset_index(drop=True)
+
+    def close(self) -> None:
+        """Release the shared memory, unlinking it if this is the owner"""
+        self.tensor = None
+        self.shm.close()
+
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> 'SharedCorpus':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+# The corpus attached to by the worker process
+_WORKER_CORPUS = None
+
+
+def _init_worker(spec: dict) -> None:
+    """Attach the worker process to the shared corpus"""
+    global _WORKER_CORPUS
+
+    _WORKER_CORPUS = SharedCorpus.attach(spec)
+
+
+def worker_corpus() -> SharedCorpus:
+    """Get the corpus attached to by the worker process of :func:`pool`
+
+    :return: The shared corpus
+    :rtype: SharedCorpus
+    """
+    return _WORKER_CORPUS
+
+
+def pool(corpus: SharedCorpus, processes: Union[int, None] = None) -> Pool:
+    """Create a process pool of workers attached to a shared corpus, see
+    :func:`worker_corpus`
+
+    :param corpus: The shared corpus
+    :type corpus: SharedCorpus
+    :param processes: The number of processes to use, defaults to `None` for
+        the number of CPUs
+    :type processes: Union[int, None], optional
+    :return: The process pool
+    :rtype: Pool
+    """
+    return Pool(processes, initializer=_init_worker, initargs=(corpus.spec, ))
+
+
+def _converge_task(task: Tuple) -> List[History]:
+    """Converge the mean of each landmark of an image of the worker corpus"""
+
+    image, type, data_dir, dtype, select_func, kwargs = task
+
+    landmarks, meta = worker_corpus().image(image, type)
+    gt = FindGrouthTruth(data_dir, dtype=dtype, download=False)
+
+    return gt.converge_landmarks(landmarks,
+                                 meta,
+                                 select_func=select_func,
+                                 **kwargs)
+
+
+def converge_images(gt: FindGrouthTruth,
+                    images: Union[Sequence[str], None] = None,
+                    type: Union[str, None] = None,
+                    select_func: Callable = find_worst_partition,
+                    processes: Union[int, None] = None,
+                    **kwargs) -> Dict[str, List[History]]:
+    """Converge the mean of each landmark of a number of images, splitting the
+    images between a pool of processes sharing the landmark tensor
+
+    :param gt: The ground truth finder
+    :type gt: FindGrouthTruth
+    :param images: The selected images, defaults to `None` for all images
+    :type images: Union[Sequence[str], None], optional
+    :param type: The type of annotator to select, defaults to `None` for all
+        annotators
+    :type type: Union[str, None], optional
+    :param select_func: The function used to select the annotators to exclude
+        each iteration, must be picklable, defaults to
+        :func:`~johnstondechazal.method.find_worst_partition`
+    :type select_func: Callable, optional
+    :param processes: The number of processes to use, defaults to `None` for
+        the number of CPUs
+    :type processes: Union[int, None], optional
+    :return: The history of each landmark of each image
+    :rtype: Dict[str, List[History]]
+
+    Additional keyword arguments are passed to
+    :meth:`~johnstondechazal.groundtruth.FindGrouthTruth.converge_select`.
+    """
+
+    df = load_all_landmarks(dirpath=gt.data_dir,
+                            filters=gt.restrict_filters(type, images))
+    tensor, meta, images = corpus_tensor(df,
+                                         images,
+                                         dtype=gt.dtype or np.float64)
+
+    tasks = [(idx, type, gt.data_dir, gt.dtype, select_func, kwargs)
+             for idx in range(len(images))]
+
+    with SharedCorpus.publish(tensor, meta, images) as corpus:
+        del tensor
+
+        with pool(corpus, processes) as workers:
+            results = workers.map(_converge_task, tasks)
+
+    return dict(zip(images, results))
@@ -7,54 +7,251 @@
 """
 __author__ = 'Ben Johnston'
 
-from typing import Tuple
+import os
+from typing import List, Sequence, Tuple, Union
 
 import matplotlib.axes
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 
+from johnstondechazal.data import (IMAGE_DIR, LANDMARK_DIR, LandmarkFilter,
+                                   load_all_landmarks, load_image)
+from johnstondechazal.groundtruth import FindGrouthTruth
 from johnstondechazal.history import History
+from johnstondechazal.shared import (SharedCorpus, corpus_tensor, pool,
+                                     worker_corpus)
+
+# Figure reused by each render within a process
+_FIGURE = None
+
+
+def plot_histories(hists: Sequence[History],
+                   ax: matplotlib.axes.Axes,
+                   c: Tuple[str, str] = ['b', 'r'],
+                   marker='o') -> List:
+    """Plot the history of a number of landmarks, e.g. all of the landmarks
+    of a face.  The paths of all histories are drawn as a single line
+    collection with one scatter for the global means and one for the final
+    locations.
+
+    :param hists: The landmark histories
+    :type hists: Sequence[History]
+    :param ax: The axes to plot on
+    :type ax: matplotlib.axes.Axes
+    :param c: The colours of the path and the final location, defaults to
+        ['b', 'r']
+    :type c: Tuple[str, str], optional
+    :param marker: The marker of the global mean and final locations,
+        defaults to 'o'
+    :type marker: str, optional
+    :return: The plotted artists
+    :rtype: List
+    """
+
+    locs = [hist.locs for hist in hists if len(hist) > 0]
+    paths = [loc for loc in locs if len(loc) > 1]
+    points = []
+
+    if paths:
+        segments = np.concatenate(
+            [np.stack([loc[:-1], loc[1:]], axis=1) for loc in paths])
+        points.append(
+            ax.add_collection(
+                LineCollection(segments, colors=c[0], linestyles='--')))
+
+        global_means = np.array([loc[0] for loc in paths])
+        points.append(
+            ax.scatter(global_means[:, 0],
+                       global_means[:, 1],
+                       c=c[0],
+                       marker=marker,
+                       label='Global Mean'))
+
+    if locs:
+        final_locs = np.array([loc[-1] for loc in locs])
+        points.append(
+            ax.scatter(final_locs[:, 0],
+                       final_locs[:, 1],
+                       c=c[1],
+                       marker=marker,
+                       label='Final Location'))
+
+    ax.autoscale_view()
+
+    return points
 
 
 def plot_history(hist: History,
                  ax: matplotlib.axes.Axes,
                  c: Tuple[str, str] = ['b', 'r'],
-                 marker='o'):  # pragma: no cover
+                 marker='o') -> List:  # pragma: no cover
     """Plot landmark history
 
-    :param hist: [description]
+    :param hist: The landmark history
     :type hist: History
-    :param figure: [description]
-    :type figure: plt.figure
-    :return: [description]
-    :rtype: plt.figure
+    :param ax: The axes to plot on
+    :type ax: matplotlib.axes.Axes
+    :param c: The colours of the path and the final location, defaults to
+        ['b', 'r']
+    :type c: Tuple[str, str], optional
+    :param marker: The marker of the global mean and final locations,
+        defaults to 'o'
+    :type marker: str, optional
+    :return: The plotted artists
+    :rtype: List
     """
 
-    num_samples = len(hist)
-    points = []
+    return plot_histories([hist], ax, c=c, marker=marker)
 
-    # Plot means
-    for idx, (mean, *_) in enumerate(hist):
-
-        if (idx + 1) == num_samples:
-            points.append(
-                ax.scatter(mean[0],
-                           mean[1],
-                           c=c[1],
-                           marker=marker,
-                           label='Final Location'))
-
-        elif idx == 0:
-            points.append(
-                ax.scatter(mean[0],
-                           mean[1],
-                           c=c[0],
-                           marker=marker,
-                           label='Global Mean'))
-
-        if idx > 0:
-            points.append(
-                ax.plot([prev_mean[0], mean[0]], [prev_mean[1], mean[1]],
-                        c=c[0],
-                        linestyle='--'))
-        prev_mean = mean
 
-    return points
+def _get_figure() -> Figure:
+    """Get the figure of the current process, created with the Agg canvas so
+    that no display is required"""
+
+    global _FIGURE
+
+    if _FIGURE is None:
+        _FIGURE = Figure()
+        FigureCanvasAgg(_FIGURE)
+
+    return _FIGURE
+
+
+def render_overlay(image: str,
+                   hists: Sequence[History],
+                   output_path: str,
+                   image_dir: str = IMAGE_DIR,
+                   traces: bool = True,
+                   dpi: int = 100,
+                   figure: Union[Figure, None] = None) -> str:
+    """Render the ground truth locations of an image over the image and save
+    the result
+
+    :param image: The image name
+    :type image: str
+    :param hists: The history of each landmark of the image
+    :type hists: Sequence[History]
+    :param output_path: The path of the rendered image
+    :type output_path: str
+    :param image_dir: The directory containing the images, defaults to
+        IMAGE_DIR
+    :type image_dir: str, optional
+    :param traces: Draw the convergence path of each landmark in addition to
+        the final location, defaults to `True`
+    :type traces: bool, optional
+    :param dpi: The resolution of the rendered figure, defaults to 100
+    :type dpi: int, optional
+    :param figure: The figure to render to, defaults to `None` to reuse the
+        figure of the current process
+    :type figure: Union[Figure, None], optional
+    :return: The path of the rendered image
+    :rtype: str
+    """
+
+    fig = _get_figure() if figure is None else figure
+    fig.clf()
+
+    img = load_image(image, image_dir)
+    height, width = img.shape[:2]
+    fig.set_size_inches(width / dpi, height / dpi)
+
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.imshow(img, cmap='gray' if img.ndim == 2 else None)
+
+    if traces:
+        plot_histories(hists, ax)
+    else:
+        final_locs = np.array([hist.loc for hist in hists])
+        ax.scatter(final_locs[:, 0], final_locs[:, 1], c='r', marker='o')
+
+    ax.set_xlim(0, width)
+    ax.set_ylim(height, 0)
+    ax.set_axis_off()
+
+    fig.savefig(output_path, dpi=dpi)
+
+    return output_path
+
+
+def _render_image(corpus: SharedCorpus, index: int, output_dir: str,
+                  image_dir: str, traces: bool) -> str:
+    """Compute the ground truth of an image and render the overlay"""
+
+    image = corpus.images[index]
+    landmarks, meta = corpus.image(index)
+    hists = FindGrouthTruth(download=False).converge_landmarks(landmarks, meta)
+
+    output_path = os.path.join(output_dir,
+                               os.path.splitext(image)[0] + '.png')
+
+    return render_overlay(image,
+                          hists,
+                          output_path,
+                          image_dir=image_dir,
+                          traces=traces)
+
+
+def _render_task(task: Tuple[int, str, str, bool]) -> str:
+    """Render an image of the corpus shared with the worker process"""
+
+    return _render_image(worker_corpus(), *task)
+
+
+def render_overlays(output_dir: str,
+                    images: Union[Sequence[str], None] = None,
+                    data_dir: str = LANDMARK_DIR,
+                    image_dir: str = IMAGE_DIR,
+                    type: Union[str, None] = None,
+                    traces: bool = True,
+                    processes: Union[int, None] = None) -> List[str]:
+    """Render the ground truth overlay of each image as a PNG.  The landmarks
+    are loaded once into shared memory and the images are split between a
+    pool of processes, each of which reuses a single figure.
+
+    :param output_dir: The directory to save the rendered images to
+    :type output_dir: str
+    :param images: The images to render, defaults to `None` for every image
+        in `image_dir` with landmarks
+    :type images: Union[Sequence[str], None], optional
+    :param data_dir: The directory containing the facial landmark data,
+        defaults to LANDMARK_DIR
+    :type data_dir: str, optional
+    :param image_dir: The directory containing the images, defaults to
+        IMAGE_DIR
+    :type image_dir: str, optional
+    :param type: The type of annotator to select, defaults to `None` for all
+        annotators
+    :type type: Union[str, None], optional
+    :param traces: Draw the convergence path of each landmark, defaults to
+        `True`
+    :type traces: bool, optional
+    :param processes: The number of processes to use, defaults to `None` for
+        the number of CPUs
+    :type processes: Union[int, None], optional
+    :return: The paths of the rendered images
+    :rtype: List[str]
+    """
+
+    df = load_all_landmarks(
+        dirpath=data_dir,
+        filters=None if type is None else LandmarkFilter(types=[type]))
+
+    if images is None:
+        images = sorted(set(df.filename) & set(os.listdir(image_dir)))
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    tensor, meta, images = corpus_tensor(df, images)
+    tasks = [(idx, output_dir, image_dir, traces)
+             for idx in range(len(images))]
+
+    with SharedCorpus.publish(tensor, meta, images) as corpus:
+        del tensor
+
+        if processes == 1:
+            return [_render_image(corpus, *task) for task in tasks]
+
+        with pool(corpus, processes) as workers:
+            return workers.map(_render_task, tasks)
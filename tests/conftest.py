@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Shared test fixtures
+
+"""
+__author__ = 'Ben Johnston'
+
+import json
+import os
+from tempfile import mkdtemp
+
+import numpy as np
+import pytest
+
+CORPUS_IMAGES = ['indoor_006.png', 'outdoor_012.png']
+CORPUS_WORKERS = ['A1', 'A2', 'A3']
+CORPUS_EXPERTS = ['1', '2']
+CORPUS_LANDMARKS = 3
+CORPUS_REPLICATES = 2
+CORPUS_SIZE = (102, 76)
+
+
+def _samples(rng: np.random.RandomState, truth: np.ndarray,
+             spread: float) -> list:
+    """Annotations of every image and replicate"""
+
+    samples = []
+    for replicate in range(CORPUS_REPLICATES):
+        for image, image_truth in zip(CORPUS_IMAGES, truth):
+            coords = np.round(image_truth + rng.randn(*image_truth.shape) *
+                              spread).astype(int)
+            samples.append({
+                'filename': f'/images/{image}',
+                'width': CORPUS_SIZE[0],
+                'height': CORPUS_SIZE[1],
+                'landmarks': [{
+                    'id': f'P{idx + 1}',
+                    'distLim': 10,
+                    'user_x': int(x),
+                    'user_y': int(y),
+                } for idx, (x, y) in enumerate(coords)],
+            })
+
+    return samples
+
+
+@pytest.fixture
+def corpus_dir() -> str:
+    """A small synthetic landmark data set of MTurk workers and experts"""
+
+    data_dir = mkdtemp()
+    rng = np.random.RandomState(0)
+
+    truth = rng.uniform(20, 60, size=(len(CORPUS_IMAGES), CORPUS_LANDMARKS, 2))
+
+    for worker in CORPUS_WORKERS:
+        results = {'samples': _samples(rng, truth, 3)}
+        with open(os.path.join(data_dir, f'{worker}.json'), 'w') as f:
+            json.dump(
+                {
+                    'WorkerId': worker,
+                    'Answers': [{
+                        'FreeText': 'msg'
+                    }, {
+                        'FreeText': json.dumps(results)
+                    }],
+                }, f)
+
+    for expert in CORPUS_EXPERTS:
+        with open(os.path.join(data_dir, f'{expert}.json'), 'w') as f:
+            json.dump({'results': {'samples': _samples(rng, truth, 1)}}, f)
+
+    return data_dir
+
+
+@pytest.fixture
+def outlier_corpus_dir(corpus_dir: str) -> str:
+    """The synthetic data set with the selections of worker A1 outside of the
+    images"""
+
+    path = os.path.join(corpus_dir, 'A1.json')
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    results = json.loads(data['Answers'][1]['FreeText'])
+    for sample in results['samples']:
+        for landmark in sample['landmarks']:
+            landmark['user_x'] += CORPUS_SIZE[0]
+
+    data['Answers'][1]['FreeText'] = json.dumps(results)
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+    return corpus_dir
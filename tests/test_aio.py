@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test aio module
+
+"""
+__author__ = 'Ben Johnston'
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from johnstondechazal.aio import AsyncGroundTruth
+from johnstondechazal.cache import result_key
+from johnstondechazal.groundtruth import FindGrouthTruth
+
+
+def test_converge_image(corpus_dir):
+    """Test computing the ground truth in the executors"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    agt = AsyncGroundTruth(gt, ThreadPoolExecutor(1), ThreadPoolExecutor(1))
+
+    history = asyncio.run(agt.converge_image('indoor_006.png', 2, 'worker'))
+
+    # The landmark is selected by ID, as FindGrouthTruth.converge_image
+    expected = gt.converge_image('indoor_006.png', 'worker', landmarks=[2])[0]
+
+    np.testing.assert_equal(history.locs, expected.locs)
+
+    with pytest.raises(ValueError):
+        asyncio.run(agt.converge_image('indoor_006.png', 99))
+
+
+def test_coalesce_requests():
+    """Test sharing a computation between concurrent identical requests"""
+
+    gt = FindGrouthTruth(download=False)
+    calls = []
+    lock = threading.Lock()
+
+    def _converge_select(landmarks, meta, select_func, **kwargs):
+        with lock:
+            calls.append(landmarks.sum())
+        time.sleep(0.05)
+        return landmarks.sum()
+
+    gt.converge_select = _converge_select
+    agt = AsyncGroundTruth(gt, cpu_executor=ThreadPoolExecutor(4))
+
+    landmarks = np.ones((3, 2))
+    meta = pd.DataFrame({'workerid': ['a', 'b', 'c']})
+
+    async def _requests():
+        return await asyncio.gather(
+            agt.converge_select(landmarks, meta),
+            agt.converge_select(landmarks.copy(), meta),
+            agt.converge_select(landmarks * 2, meta),
+        )
+
+    threads = []
+
+    def _result_key(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return result_key(*args, **kwargs)
+
+    with patch('johnstondechazal.aio.result_key', side_effect=_result_key):
+        assert asyncio.run(_requests()) == [6, 6, 12]
+
+    assert sorted(calls) == [6, 12]
+    assert not agt._inflight
+
+    # The landmarks are hashed in the executor, not on the event loop
+    assert threading.main_thread() not in threads
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test cache module
+
+"""
+__author__ = 'Ben Johnston'
+
+from functools import partial
+from tempfile import mkdtemp
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from johnstondechazal.cache import ResultCache, result_key
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import find_worst_partition, find_worst_sum
+
+
+@pytest.fixture
+def landmark_set():
+    meta = pd.DataFrame.from_dict({
+        'workerid': [str(x) for x in range(5)],
+        'type': ['worker'] * 5,
+    })
+
+    landmarks = np.random.RandomState(0).randn(5, 4, 2)
+
+    return landmarks, meta
+
+
+def test_result_key(landmark_set):
+    """Test keying results on the inputs and parameters"""
+
+    landmarks, meta = landmark_set
+
+    key = result_key(landmarks, meta, find_worst_partition, tol=1e-4)
+
+    assert key == result_key(landmarks.copy(), meta, find_worst_partition,
+                             tol=1e-4)
+    assert key != result_key(landmarks + 1, meta, find_worst_partition,
+                             tol=1e-4)
+    assert key != result_key(landmarks, meta, find_worst_sum, tol=1e-4)
+    assert key != result_key(landmarks, meta, find_worst_partition, tol=1e-3)
+    assert key != result_key(landmarks, meta,
+                             partial(find_worst_partition, num_exclude=2),
+                             tol=1e-4)
+    assert result_key(landmarks, meta, lambda x: x) is None
+
+
+def test_cache_eviction():
+    """Test evicting the least recently used results"""
+
+    cache = ResultCache(maxsize=2)
+
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert len(cache) == 2
+
+
+def test_converge_select_cached(landmark_set):
+    """Test returning cached results"""
+
+    landmarks, meta = landmark_set
+    cache_dir = mkdtemp()
+
+    gt = FindGrouthTruth(download=False,
+                         cache=ResultCache(cache_dir=cache_dir))
+    history = gt.converge_select(landmarks, meta)
+
+    with patch.object(gt, '_converge_select') as converge_patch:
+        assert gt.converge_select(landmarks.copy(), meta) is history
+        converge_patch.assert_not_called()
+
+    # Load the results saved on disk
+    gt = FindGrouthTruth(download=False,
+                         cache=ResultCache(cache_dir=cache_dir))
+
+    with patch.object(gt, '_converge_select') as converge_patch:
+        cached = gt.converge_select(landmarks, meta)
+        converge_patch.assert_not_called()
+
+    np.testing.assert_equal(cached.locs, history.locs)
+    assert gt.cache.hits == 1
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test checkpoint module
+
+"""
+__author__ = 'Ben Johnston'
+
+import os
+from functools import partial
+from tempfile import mkdtemp
+
+import numpy as np
+import pytest
+
+from johnstondechazal.cache import function_key
+from johnstondechazal.checkpoint import RunManifest, filters_key, run_corpus
+from johnstondechazal.data import LandmarkFilter
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import find_worst_partition, prefilter_outliers
+from johnstondechazal.progress import Cancelled, CancellationToken
+
+
+def test_function_key():
+    """Test naming the select function"""
+
+    assert function_key(find_worst_partition) == \
+        'johnstondechazal.method.find_worst_partition'
+    assert function_key(partial(find_worst_partition, num_exclude=2)) == \
+        'johnstondechazal.method.find_worst_partition(num_exclude=2)'
+
+
+def test_run_corpus_resume(corpus_dir):
+    """Test resuming a cancelled run"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    path = os.path.join(mkdtemp(), 'manifest.jsonl')
+    cancel = CancellationToken()
+
+    def _progress(done, total):
+        if done == 4:
+            cancel.cancel()
+
+    with pytest.raises(Cancelled):
+        run_corpus(gt,
+                   path,
+                   types=['worker', 'expert'],
+                   progress=_progress,
+                   cancel=cancel)
+
+    assert len(RunManifest(path)) == 4
+
+    completed = []
+    results = run_corpus(gt,
+                         path,
+                         types=['worker', 'expert'],
+                         progress=lambda done, total: completed.append(done))
+
+    # 2 images x 3 landmarks x 2 types, the first 4 units are skipped
+    assert completed == [4, 5, 6, 7, 8, 9, 10, 11, 12]
+    assert len(results) == 12
+    assert len(RunManifest(path)) == 12
+
+    worker = results.loc[results.type == 'worker'].iloc[0]
+    assert sorted(worker.elimination_order) == ['A1', 'A2', 'A3']
+
+
+def test_run_corpus_params(corpus_dir):
+    """Test the units are only resumed with the same parameters"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    path = os.path.join(mkdtemp(), 'manifest.jsonl')
+
+    # An image without landmarks of a type has no units
+    results = run_corpus(gt, path, types=['worker', 'student'])
+    assert len(results) == 6
+
+    completed = []
+    results = run_corpus(gt,
+                         path,
+                         types=['worker'],
+                         progress=lambda done, total: completed.append(done),
+                         iterations=1)
+
+    # 2 images x 3 landmarks, none are skipped with different parameters
+    assert completed == [0, 1, 2, 3, 4, 5, 6]
+    assert len(results) == 12
+    assert len(RunManifest(path)) == 12
+    assert results.params.nunique() == 2
+
+    with pytest.raises(ValueError):
+        run_corpus(gt, path, prefilter=lambda landmarks: landmarks)
+
+
+def test_run_corpus_bounds(outlier_corpus_dir):
+    """Test the size of each image is passed to the prefilter"""
+
+    gt = FindGrouthTruth(outlier_corpus_dir, download=False)
+    path = os.path.join(mkdtemp(), 'manifest.jsonl')
+
+    results = run_corpus(gt,
+                         path,
+                         types=['worker'],
+                         prefilter=prefilter_outliers)
+
+    assert len(results) == 6
+    assert all(x[0] == 'A1' for x in results.elimination_order)
+
+
+def test_run_corpus_settings(corpus_dir):
+    """Test the units are only resumed with the same type and filters"""
+
+    path = os.path.join(mkdtemp(), 'manifest.jsonl')
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    run_corpus(gt, path, types=['worker'])
+
+    blacklist = FindGrouthTruth(corpus_dir,
+                                download=False,
+                                filters=LandmarkFilter(exclude_workers={'A2'}))
+    results = run_corpus(blacklist, path, types=['worker'])
+
+    assert len(results) == 12
+    assert results.filters.nunique() == 2
+
+    resumed = results.loc[results.filters == filters_key(blacklist.filters)]
+    assert all('A2' not in x for x in resumed.elimination_order)
+
+    # The order of a collection does not change the filters
+    assert filters_key(LandmarkFilter(exclude_workers=['A2', 'A3'])) == \
+        filters_key(LandmarkFilter(exclude_workers=['A3', 'A2']))
+
+    results = run_corpus(FindGrouthTruth(corpus_dir,
+                                         dtype=np.float32,
+                                         download=False),
+                         path,
+                         types=['worker'])
+
+    assert len(results) == 18
+    assert (results.dtype == '<f4').sum() == 6
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test compare module
+
+"""
+__author__ = 'Ben Johnston'
+
+import numpy as np
+
+from johnstondechazal.compare import compare_types
+from johnstondechazal.groundtruth import FindGrouthTruth
+
+
+def test_compare_types(corpus_dir):
+    """Test comparing the expert and worker ground truth"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    landmarks, summary = compare_types(gt)
+
+    assert len(landmarks) == 6
+    assert list(summary.image) == ['indoor_006.png', 'outdoor_012.png']
+    assert (landmarks.expert_annotators == 2).all()
+    assert (landmarks.worker_annotators == 3).all()
+
+    for _type in ['expert', 'worker']:
+        arr, meta = gt.load_landmarks_image('outdoor_012.png', _type)
+        loc = gt.converge_select(arr[:, :, 2], meta).loc
+
+        row = landmarks.loc[(landmarks.image == 'outdoor_012.png')
+                            & (landmarks.landmark == 3)].iloc[0]
+        np.testing.assert_allclose([row[f'{_type}_x'], row[f'{_type}_y']],
+                                   loc)
+
+    np.testing.assert_allclose(
+        landmarks.error, np.hypot(landmarks.worker_x - landmarks.expert_x,
+                                  landmarks.worker_y - landmarks.expert_y))
+    np.testing.assert_allclose(
+        summary.max_error,
+        landmarks.groupby('image').error.max().values)
@@ -7,16 +7,22 @@ Test data module
 """
 __author__ = 'Ben Johnston'
 
+import json
 import os
 from tempfile import mkdtemp
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
 import pytest
+from imageio import imwrite
 
-from johnstondechazal.data import (_json_to_landmarks, dataframe_to_numpy,
-                                   download_data, json_landmarks_to_dataframe,
-                                   load_all_landmarks, load_image)
+from johnstondechazal.data import (SAMPLE_COLUMNS, ImageCache,
+                                   LandmarkFilter, _json_to_landmarks,
+                                   dataframe_to_numpy, download_data,
+                                   json_landmarks_to_dataframe,
+                                   landmarks_in_bounds, load_all_landmarks,
+                                   load_image, read_image_size)
 
 TEST_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -68,6 +74,8 @@ def test_load_expert_landmarks(expert_landmarks):
         ],
         'workerid': ['2', '2'],
         'type': ['expert', 'expert'],
+        'width': [1024, 1203],
+        'height': [768, 1018],
         13: [(856, 375), (956, 475)],
         61: [(456, 274), (488, 726)],
     })
@@ -87,6 +95,8 @@ def test_load_worker_landmarks(worker_landmarks):
         ],
         'workerid': ['A304PUXIRA930J', 'A304PUXIRA930J'],
         'type': ['worker', 'worker'],
+        'width': [1024, 1024],
+        'height': [768, 768],
         13: [(848, 411), (964, 511)],
         63: [(601, 464), (631, 264)],
     })
@@ -118,6 +128,26 @@ def test_extract_landmarks_numpy():
     assert np.all(numpy_coords == expected_result)
 
 
+def test_extract_landmarks_numpy_dtype():
+    """Test extracting landmarks as a single precision array"""
+
+    input_dataframe = pd.DataFrame.from_dict({
+        'filename': [
+            'indoor_006.png',
+            'aflw__face_41556.jpg',
+        ],
+        'workerid': ['A304PUXIRA930J', 'A304PUXIRA930J'],
+        'type': ['worker', 'worker'],
+        13: [(848, 411), (964, 511)],
+        63: [(601, 464), (631, 264)],
+    })
+
+    numpy_coords = dataframe_to_numpy(input_dataframe, dtype=np.float32)
+
+    assert numpy_coords.dtype == np.float32
+    assert numpy_coords[0, 0, 0] == 848
+
+
 def test_extract_worker_lmrks_numpy():
     """Test extract worker landmarks as numpy"""
 
@@ -206,3 +236,165 @@ def test_load_image():
 
     img = load_image('i001qa-mn.jpg')
     assert img.shape == (640, 480, 3)
+
+
+def test_image_cache():
+    """Test evicting the least recently used images"""
+
+    cache = ImageCache(max_bytes=200)
+
+    cache.put('a', np.zeros(100, dtype=np.uint8))
+    cache.put('b', np.zeros(100, dtype=np.uint8))
+    assert cache.get('a') is not None
+
+    cache.put('c', np.zeros(100, dtype=np.uint8))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.nbytes == 200
+
+    cache.resize(100)
+    assert len(cache) == 1
+
+
+def test_load_image_pyramid():
+    """Test loading a downsampled image"""
+
+    image_dir = mkdtemp()
+    pyramid_dir = os.path.join(image_dir, 'pyramid')
+    imwrite(os.path.join(image_dir, 'test.png'),
+            np.random.randint(0, 255, size=(64, 48, 3), dtype=np.uint8))
+
+    img = load_image('test.png', image_dir)
+
+    # The cached image is shared and read only
+    with patch('johnstondechazal.data.imread') as imread_patch:
+        cached = load_image('test.png', image_dir)
+        imread_patch.assert_not_called()
+
+    assert cached is img
+    assert not cached.flags.writeable
+
+    # A copy is only made on request
+    writable = load_image('test.png', image_dir, copy=True)
+    np.testing.assert_equal(writable, img)
+    writable[:] = 0
+    assert load_image('test.png', image_dir).any()
+
+    thumbnail = load_image('test.png',
+                           image_dir,
+                           level=2,
+                           pyramid_dir=pyramid_dir)
+
+    assert thumbnail.shape == (16, 12, 3)
+    assert len(os.listdir(pyramid_dir)) == 2
+
+    # The same image name in another directory has its own pyramid
+    other_dir = mkdtemp()
+    imwrite(os.path.join(other_dir, 'test.png'),
+            np.full((64, 48, 3), 200, dtype=np.uint8))
+
+    other = load_image('test.png',
+                       other_dir,
+                       level=1,
+                       pyramid_dir=pyramid_dir,
+                       cache=False)
+    assert (other == 200).all()
+
+    # The pyramid is rebuilt when the image changes
+    imwrite(os.path.join(other_dir, 'test.png'),
+            np.full((64, 48, 3), 100, dtype=np.uint8))
+    os.utime(os.path.join(other_dir, 'test.png'), ns=(0, 0))
+
+    other = load_image('test.png', other_dir, level=1, pyramid_dir=pyramid_dir)
+    assert (other == 100).all()
+
+
+def test_read_image_size():
+    """Test reading the image size from the header"""
+
+    image_dir = mkdtemp()
+    imwrite(os.path.join(image_dir, 'test.png'),
+            np.zeros((64, 48, 3), dtype=np.uint8))
+
+    assert read_image_size('test.png', image_dir) == (48, 64)
+
+
+def test_landmarks_in_bounds(expert_landmarks):
+    """Test checking the landmarks are within the images"""
+
+    df = json_landmarks_to_dataframe(expert_landmarks)
+    in_bounds = landmarks_in_bounds(df)
+
+    assert np.all(in_bounds)
+
+    image_dir = mkdtemp()
+    imwrite(os.path.join(image_dir, 'indoor_006.png'),
+            np.zeros((400, 500, 3), dtype=np.uint8))
+
+    in_bounds = landmarks_in_bounds(df.iloc[:1], image_dir)
+
+    np.testing.assert_equal(in_bounds.values, [[False, True]])
+
+
+def test_landmark_filter(corpus_dir):
+    """Test skipping annotators and images while parsing"""
+
+    filters = LandmarkFilter(exclude_workers=['A2'],
+                             types=['worker'],
+                             images=lambda x: x.startswith('indoor'))
+
+    with patch('johnstondechazal.data.json.loads',
+               side_effect=json.loads) as loads:
+        df = load_all_landmarks(dirpath=corpus_dir, filters=filters)
+
+    # The 2 excluded expert files are not parsed, and only the samples of the
+    # 2 selected workers are parsed
+    assert loads.call_count == 3 + 2
+
+    assert sorted(df.workerid.unique()) == ['A1', 'A3']
+    assert list(df.filename.unique()) == ['indoor_006.png']
+    assert len(df) == 4
+
+    df = load_all_landmarks('outdoor_012.png',
+                            dirpath=corpus_dir,
+                            filters=filters.restrict(types=['expert']))
+    assert df.empty
+
+    # The excluded expert file is not opened
+    with patch('johnstondechazal.data.open', side_effect=open) as opened:
+        df = load_all_landmarks(dirpath=corpus_dir,
+                                filters=LandmarkFilter(exclude_workers=['1'],
+                                                       types=['expert']))
+
+    assert opened.call_count == 4
+    assert list(df.workerid.unique()) == ['2']
+
+
+def test_landmark_filter_empty(corpus_dir):
+    """Test a filter excluding every annotator keeps the columns"""
+
+    df = load_all_landmarks(dirpath=corpus_dir,
+                            filters=LandmarkFilter(types=['nobody']))
+
+    assert df.empty
+    assert list(df.columns) == SAMPLE_COLUMNS
+
+    df = load_all_landmarks('missing.png', dirpath=corpus_dir)
+
+    assert df.empty
+    assert list(df.columns) == SAMPLE_COLUMNS[1:] + [1, 2, 3]
+
+    landmarks, meta = dataframe_to_numpy(df, squeeze=False)
+    assert landmarks.shape == (0, 0, 3, 2)
+    assert meta.empty
+
+
+def test_load_landmark_subset(corpus_dir):
+    """Test extracting a subset of the landmarks"""
+
+    df = load_all_landmarks(dirpath=corpus_dir, landmarks=[1, 3])
+    full = load_all_landmarks(dirpath=corpus_dir)
+
+    assert [x for x in df.columns if isinstance(x, int)] == [1, 3]
+    pd.testing.assert_frame_equal(df, full.drop(columns=[2]))
@@ -6,14 +6,19 @@ Test finding the ground truth
 
 """
 
+from functools import partial
 from tempfile import mkdtemp
 from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
+import pytest
 from scipy.spatial.distance import euclidean
 
+from johnstondechazal.data import LandmarkFilter
 from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.method import find_worst_sum, prefilter_outliers
+from johnstondechazal.progress import Cancelled, CancellationToken
 
 np.random.seed(0)
 
@@ -89,3 +94,255 @@ def test_converge_select(download_patch):
 
     assert euclidean(selected_landmarks, synth_mean) < euclidean(
         global_mean, synth_mean)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_incremental(download_patch):
+    """Test converging with the incrementally updated mean"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(10)],
+        'type': ['worker'] * 10,
+    })
+
+    synth_mean = np.array([10, 12])
+    landmarks = np.random.randn(10, 4, 2) + synth_mean
+    landmarks[:3] += np.random.randn(3, 4, 2) * 10
+
+    gt = FindGrouthTruth()
+    selection = gt.converge_select(landmarks, meta)
+    incremental = gt.converge_select(landmarks, meta, refresh_tol=1e-2)
+
+    assert len(incremental) == len(selection)
+    assert euclidean(incremental.loc, selection.loc) < 0.5
+    assert len(incremental[-1][-1]) == 1
+
+    # The first step is converged in full, later steps only when refreshed
+    assert incremental.iterations[1] > 0
+    assert incremental.iterations.sum() < selection.iterations.sum()
+
+    refreshed = gt.converge_select(landmarks, meta, refresh_tol=0)
+    assert np.all(refreshed.iterations[1:] > 0)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_single_annotator(download_patch):
+    """Test converging a single annotator with find_worst_sum"""
+
+    meta = pd.DataFrame.from_dict({
+        'workerid': ['1'],
+        'type': ['worker'],
+    })
+    landmarks = np.random.randn(1, 4, 2)
+
+    gt = FindGrouthTruth()
+    for kwargs in [{}, {'use_mask': True}, {'refresh_tol': 1e-2}]:
+        history = gt.converge_select(landmarks,
+                                     meta,
+                                     select_func=find_worst_sum,
+                                     **kwargs)
+
+        assert len(history) == 2
+        np.testing.assert_allclose(history.loc,
+                                   landmarks[0].mean(axis=0),
+                                   atol=1e-8)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_included(download_patch):
+    """Test the history records the remaining annotators of meta"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(5)],
+        'type': ['worker'] * 5,
+    })
+
+    landmarks = np.random.randn(5, 4, 2)
+
+    gt = FindGrouthTruth()
+    selection = gt.converge_select(landmarks, meta)
+
+    for mean, selected, included in list(selection)[1:]:
+        idx = included.index.values
+        np.testing.assert_equal(selected, landmarks[idx])
+
+    assert selection.iterations[0] == 0
+    assert np.all(selection.iterations[1:] > 0)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_mask(download_patch):
+    """Test converging with a mask of the active annotators"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(5)],
+        'type': ['worker'] * 5,
+    })
+
+    landmarks = np.random.randn(5, 4, 2)
+
+    gt = FindGrouthTruth()
+    selection = gt.converge_select(landmarks, meta)
+    masked = gt.converge_select(landmarks, meta, use_mask=True)
+
+    np.testing.assert_almost_equal(masked.loc, selection.loc)
+
+    for (_, _, included), (_, _, mask_included) in zip(selection, masked):
+        assert np.all(included.index == mask_included.index)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_landmarks(download_patch):
+    """Test converging each landmark of an image"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(5)],
+        'type': ['worker'] * 5,
+    })
+
+    landmarks = np.random.randn(5, 4, 3, 2)
+
+    gt = FindGrouthTruth()
+    hists = gt.converge_landmarks(landmarks, meta)
+
+    assert len(hists) == 3
+
+    for idx, hist in enumerate(hists):
+        expected = gt.converge_select(landmarks[:, :, idx], meta)
+        np.testing.assert_equal(hist.loc, expected.loc)
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_prefilter(download_patch):
+    """Test removing outliers before converging"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(6)],
+        'type': ['worker'] * 6,
+    })
+
+    landmarks = np.random.randn(6, 4, 2) + np.array([10, 12])
+    landmarks[2] += 500
+
+    gt = FindGrouthTruth()
+
+    for kwargs in [{}, {'use_mask': True}, {'refresh_tol': 1e-2}]:
+        selection = gt.converge_select(
+            landmarks,
+            meta,
+            prefilter=lambda x: prefilter_outliers(x, bounds=(100, 100)),
+            **kwargs)
+
+        assert list(selection.filtered.Workerid) == ['2']
+        assert len(selection) == 5
+        assert '2' not in list(selection[1][-1].Workerid)
+        assert euclidean(selection.loc, [10, 12]) < 5
+
+
+@patch('johnstondechazal.groundtruth.download_data')
+def test_converge_select_init(download_patch):
+    """Test starting the convergence from robust estimates"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [str(x) for x in range(8)],
+        'type': ['worker'] * 6 + ['expert'] * 2,
+    })
+
+    landmarks = np.random.randn(8, 4, 2) + np.array([10, 12])
+    landmarks[:2] += np.random.randn(2, 4, 2) * 30
+
+    gt = FindGrouthTruth()
+    selection = gt.converge_select(landmarks, meta)
+
+    for init in ['median', 'trimmed', 'expert']:
+        robust = gt.converge_select(landmarks, meta, init=init)
+        assert euclidean(robust.loc, selection.loc) < 0.5
+
+
+def test_converge_images(corpus_dir):
+    """Test converging every image of the data set"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    results = gt.converge_images()
+
+    assert sorted(results) == ['indoor_006.png', 'outdoor_012.png']
+    assert len(results['indoor_006.png']) == 3
+
+    cancel = CancellationToken()
+
+    with pytest.raises(Cancelled) as err:
+        gt.converge_images(progress=lambda done, total: cancel.cancel(),
+                           cancel=cancel)
+
+    assert list(err.value.partial) == ['indoor_006.png']
+
+
+def test_converge_image_landmark_subset(corpus_dir):
+    """Test converging a subset of the landmarks of an image"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+
+    landmarks, meta = gt.load_landmarks_image('indoor_006.png',
+                                              'worker',
+                                              landmarks=[3])
+    full, _ = gt.load_landmarks_image('indoor_006.png', 'worker')
+    np.testing.assert_equal(landmarks, full[:, :, [2]])
+
+    hists = gt.converge_image('indoor_006.png', 'worker', landmarks=[3])
+    assert len(hists) == 1
+    np.testing.assert_equal(hists[0].locs,
+                            gt.converge_select(full[:, :, 2], meta).locs)
+
+
+def test_single_worker_filter(corpus_dir):
+    """Test loading a single whitelisted worker"""
+
+    gt = FindGrouthTruth(corpus_dir,
+                         download=False,
+                         filters=LandmarkFilter(workers=['A1']))
+
+    landmarks, meta = gt.load_landmarks_image('indoor_006.png')
+    assert landmarks.shape == (1, 2, 3, 2)
+    assert list(meta.workerid) == ['A1']
+
+    results = gt.converge_images()
+    np.testing.assert_allclose(results['indoor_006.png'][0].loc,
+                               landmarks[0, :, 0].mean(axis=0))
+
+
+def test_converge_image_bounds(outlier_corpus_dir):
+    """Test the loaders pass the size of the image to the prefilter"""
+
+    gt = FindGrouthTruth(outlier_corpus_dir, download=False)
+
+    hists = gt.converge_image('indoor_006.png',
+                              type='worker',
+                              prefilter=prefilter_outliers)
+    results = gt.converge_images(type='worker', prefilter=prefilter_outliers)
+
+    for hist in hists + results['outdoor_012.png']:
+        assert list(hist.filtered.workerid) == ['A1']
+
+    # Bounds bound to the prefilter are not replaced
+    hists = gt.converge_image('indoor_006.png',
+                              type='worker',
+                              prefilter=partial(prefilter_outliers,
+                                                bounds=(1000, 1000)))
+
+    for hist in hists:
+        assert hist.filtered.empty
+
+
+def test_empty_selection(corpus_dir):
+    """Test loading a selection without any annotators"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+
+    landmarks, meta = gt.load_landmarks_image('missing.png')
+    assert landmarks.shape == (0, 0, 3, 2)
+    assert meta.empty
+
+    assert gt.converge_images(type='nobody') == {}
+
+    with pytest.raises(ValueError):
+        gt.converge_image('missing.png')
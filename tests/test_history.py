@@ -40,9 +40,28 @@ def test_history():
         hist.add(expected_means[idx], landmark_lists[idx], include_lists[idx])
 
     assert np.all(hist.loc == expected_means[-1])
+    np.testing.assert_equal(hist.locs, np.array(expected_means))
 
     for idx, (mean, landmarks, included) in enumerate(hist):
 
         np.testing.assert_equal(mean, expected_means[idx])
         np.testing.assert_equal(landmarks, landmark_lists[idx])
         assert np.all(included == meta.iloc[include_lists[idx]])
+
+
+def test_elimination_order():
+    """Test the order the annotators were removed"""
+
+    meta = pd.DataFrame.from_dict({
+        'Workerid': [1, 2, 3, 4, 5],
+        'type': ['w', 'e', 'w', 'e', 'w']
+    })
+
+    hist = History(meta)
+    hist.add(np.array([1, 2]), None)
+    hist.add_filtered([4])
+    hist.add(np.array([2, 3]), None, [0, 1, 3])
+    hist.add(np.array([3, 4]), None, [0, 3])
+    hist.add(np.array([4, 5]), None, [3])
+
+    assert list(hist.elimination_order.Workerid) == [5, 3, 2, 1, 4]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test instrument module
+
+"""
+__author__ = 'Ben Johnston'
+
+import json
+import os
+from tempfile import mkdtemp
+
+import numpy as np
+
+from johnstondechazal import instrument
+from johnstondechazal.method import converge_mean
+
+
+def test_instrument_converge():
+    """Test timing and counting converge_mean"""
+
+    landmarks = np.random.randn(6, 4, 2)
+    events = []
+
+    with instrument.instrument() as inst:
+        inst.add_callback(lambda name, duration: events.append(name))
+        result = converge_mean(landmarks, full_output=True)
+
+    # Disabled outside of the block
+    converge_mean(landmarks)
+
+    summary = inst.summary()
+
+    assert summary['timers']['converge_mean']['calls'] == 1
+    assert summary['counters']['converge_mean.iterations'] == \
+        result.iterations
+    assert events == ['converge_mean']
+
+
+def test_chrome_trace():
+    """Test exporting a chrome trace"""
+
+    inst = instrument.Instrumentation()
+
+    with inst.timer('test'):
+        pass
+
+    path = os.path.join(mkdtemp(), 'trace.json')
+    inst.chrome_trace(path)
+
+    with open(path, 'r') as f:
+        trace = json.load(f)
+
+    event, = trace['traceEvents']
+
+    assert event['name'] == 'test'
+    assert event['ph'] == 'X'
+    assert event['dur'] >= 0
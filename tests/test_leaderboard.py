@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test leaderboard module
+
+"""
+__author__ = 'Ben Johnston'
+
+import numpy as np
+
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.leaderboard import annotator_leaderboard
+
+
+def test_annotator_leaderboard(corpus_dir):
+    """Test ranking the annotators across the corpus"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    board = annotator_leaderboard(gt, type='worker')
+
+    assert sorted(board.workerid) == ['A1', 'A2', 'A3']
+    assert (board.landmarks == 6).all()
+    assert board.mean_rank.is_monotonic_decreasing
+
+    # Exactly one worker is eliminated first and one remains last
+    np.testing.assert_allclose(board.eliminated_first.sum(), 1)
+    np.testing.assert_allclose(board.remained_last.sum(), 1)
+
+    # The ranks agree with the elimination order of each history
+    ranks = {worker: [] for worker in board.workerid}
+    for hists in gt.converge_images(type='worker').values():
+        for hist in hists:
+            for rank, worker in enumerate(hist.elimination_order.workerid):
+                ranks[worker].append(rank / 2)
+
+    np.testing.assert_allclose(board.mean_rank,
+                               [np.mean(ranks[x]) for x in board.workerid])
@@ -11,8 +11,13 @@ from unittest.mock import patch
 import numpy as np
 import pytest
 
-from johnstondechazal.method import (annotator_precision, converge_mean,
-                                     select_landmarks)
+from johnstondechazal.method import (IncrementalMean, annotator_precision,
+                                     converge_mean, converge_mean_batch,
+                                     converge_select_batch,
+                                     find_worst_partition, has_converged,
+                                     initial_estimate, prefilter_outliers,
+                                     resolvable_tol, select_landmarks,
+                                     stack_problems)
 
 
 @pytest.fixture
@@ -48,6 +53,23 @@ def test_for_div_zero(estimated_landmarks):
     assert not np.any(np.isinf(precision))
 
 
+def test_annotator_precision_buffers(estimated_landmarks):
+    """Test computing annotator precision into preallocated buffers"""
+
+    estimated_landmarks, mean, expected_precision = estimated_landmarks
+
+    out = np.empty((3, 2))
+    workspace = np.empty(estimated_landmarks.shape)
+
+    precision = annotator_precision(estimated_landmarks,
+                                    mean,
+                                    out=out,
+                                    workspace=workspace)
+
+    assert precision is out
+    np.testing.assert_almost_equal(precision, expected_precision, decimal=2)
+
+
 def test_select_landmarks():
     """Test selecting annotators from precision"""
 
@@ -63,6 +85,35 @@ def test_select_landmarks():
     np.testing.assert_equal(excluded, [0])
 
 
+def test_find_worst_partition():
+    """Test selecting the worst annotators by partial selection"""
+
+    precision = np.array([[0.33333, 0.2], [1, 1.2], [10, 1.3], [5, 6]])
+
+    included, excluded = find_worst_partition(precision)
+
+    np.testing.assert_equal(included, [1, 2, 3])
+    np.testing.assert_equal(excluded, [0])
+
+    included, excluded = find_worst_partition(precision, num_exclude=2)
+
+    np.testing.assert_equal(included, [2, 3])
+    np.testing.assert_equal(np.sort(excluded), [0, 1])
+
+
+def test_select_landmarks_partition():
+    """Test selecting annotators with index arrays"""
+
+    precision = np.array([[0.33333, 0.2], [1, 1.2], [10, 1.3], [5, 6]])
+    landmarks = np.arange(16).reshape((4, 2, 2))
+
+    selected, (included, excluded) = select_landmarks(precision, landmarks,
+                                                      find_worst_partition)
+
+    np.testing.assert_equal(selected, landmarks[1:])
+    np.testing.assert_equal(included, [1, 2, 3])
+
+
 def test_converge_mean(estimated_landmarks):
     """Test converging on a mean value"""
 
@@ -89,3 +140,259 @@ def test_converge_stopping(estimated_landmarks):
                                                iterations=100)
 
         assert p_mock.call_count == 2
+
+
+def test_converge_warm_start(estimated_landmarks):
+    """Test starting the convergence from a previously converged mean"""
+
+    estimated_landmarks, *_ = estimated_landmarks
+
+    with patch('johnstondechazal.method.annotator_precision',
+               wraps=annotator_precision) as p_mock:
+
+        global_mean, precision = converge_mean(estimated_landmarks)
+        cold_calls = p_mock.call_count
+        p_mock.reset_mock()
+
+        warm_mean, warm_precision = converge_mean(estimated_landmarks,
+                                                  initial_mean=global_mean)
+
+        assert p_mock.call_count < cold_calls
+
+    np.testing.assert_almost_equal(warm_mean, global_mean, decimal=3)
+
+
+def test_incremental_mean_remove(estimated_landmarks):
+    """Test removing an annotator from the incremental mean"""
+
+    estimated_landmarks, *_ = estimated_landmarks
+
+    engine = IncrementalMean(estimated_landmarks, refresh_tol=np.inf)
+    precision = engine.precision.copy()
+
+    mean = engine.remove(0)
+
+    expected_mean = np.average(estimated_landmarks[1:].mean(axis=1),
+                               weights=precision[1:],
+                               axis=0)
+
+    np.testing.assert_almost_equal(mean, expected_mean)
+    np.testing.assert_equal(engine.active, [False, True, True])
+    assert engine.refreshes == 1
+    assert engine.last_iterations == 0
+
+
+def test_incremental_mean_refresh():
+    """Test the incremental mean is reconverged once the mean moves"""
+
+    rng = np.random.RandomState(0)
+    estimated_landmarks = rng.randn(6, 4, 2) + np.array([10, 12])
+
+    engine = IncrementalMean(estimated_landmarks, refresh_tol=0)
+    mean = engine.remove(0)
+
+    expected_mean, _ = converge_mean(estimated_landmarks[1:])
+
+    np.testing.assert_almost_equal(mean, expected_mean, decimal=3)
+    assert engine.refreshes == 2
+    assert engine.last_iterations > 0
+
+
+def test_select_landmarks_mask():
+    """Test selecting annotators by clearing the active mask"""
+
+    precision = np.array([[0.33333, 0.2], [1, 1.2], [10, 1.3], [5, 6]])
+    landmarks = np.ones((4, 2, 2))
+    mask = np.array([False, True, True, True])
+
+    selected, (included, excluded) = select_landmarks(precision,
+                                                      landmarks,
+                                                      mask=mask)
+
+    assert selected is landmarks
+    np.testing.assert_equal(mask, [False, False, True, True])
+    np.testing.assert_equal(included, [2, 3])
+    np.testing.assert_equal(excluded, [1])
+
+
+def test_converge_mean_mask():
+    """Test converging on the mean of the active annotators"""
+
+    rng = np.random.RandomState(0)
+    estimated_landmarks = rng.randn(6, 4, 2) + np.array([10, 12])
+    mask = np.array([True, False, True, True, False, True])
+
+    global_mean, precision = converge_mean(estimated_landmarks, mask=mask)
+    expected_mean, expected_precision = converge_mean(
+        estimated_landmarks[mask])
+
+    np.testing.assert_almost_equal(global_mean, expected_mean)
+    np.testing.assert_almost_equal(precision[mask], expected_precision)
+    np.testing.assert_equal(precision[~mask], 0)
+
+
+def test_converge_mean_float32():
+    """Test converging in single precision"""
+
+    rng = np.random.RandomState(0)
+    estimated_landmarks = rng.randn(20, 4, 2) * 10 + np.array([640, 480])
+
+    global_mean, precision = converge_mean(estimated_landmarks)
+    single_mean, single_precision = converge_mean(
+        estimated_landmarks.astype(np.float32))
+
+    assert single_mean.dtype == np.float32
+    assert single_precision.dtype == np.float32
+    np.testing.assert_allclose(single_mean, global_mean, atol=2e-2)
+
+
+def test_converge_mean_float32_tolerance():
+    """Test the float32 convergence stops for image sized coordinates"""
+
+    assert resolvable_tol(1e-4, np.array([640., 480.])) == 1e-4
+    assert resolvable_tol(1e-4, np.array([640., 480.],
+                                         dtype=np.float32)) > 1e-4
+
+    rng = np.random.RandomState(0)
+    single, double = [], []
+
+    for _ in range(100):
+        landmarks = rng.randn(15, 4, 2) * rng.uniform(
+            1, 20, size=(15, 1, 1)) + rng.uniform(300, 640, 2)
+
+        single.append(
+            converge_mean(landmarks.astype(np.float32), full_output=True))
+        double.append(converge_mean(landmarks, full_output=True))
+
+    assert all(x.converged for x in single)
+    assert sum(x.iterations for x in single) <= sum(x.iterations
+                                                    for x in double)
+
+
+def test_prefilter_outliers():
+    """Test removing gross outliers"""
+
+    rng = np.random.RandomState(0)
+    estimated_landmarks = rng.randn(8, 4, 2) + np.array([10, 12])
+    estimated_landmarks[0, 1] = [-5, 12]
+    estimated_landmarks[1] += 50
+
+    keep = prefilter_outliers(estimated_landmarks, bounds=(100, 100))
+    np.testing.assert_equal(keep, [False] + [True] * 7)
+
+    keep = prefilter_outliers(estimated_landmarks, mad_threshold=3.5)
+    np.testing.assert_equal(keep[1:], [False] + [True] * 6)
+
+    keep = prefilter_outliers(estimated_landmarks,
+                              bounds=(100, 100),
+                              max_dist=10)
+    np.testing.assert_equal(keep, [False, False] + [True] * 6)
+
+
+def test_initial_estimate(estimated_landmarks):
+    """Test the initial estimates of the convergence"""
+
+    estimated_landmarks, *_ = estimated_landmarks
+
+    np.testing.assert_almost_equal(initial_estimate(estimated_landmarks),
+                                   [0.7, 2.33333], decimal=4)
+    np.testing.assert_almost_equal(
+        initial_estimate(estimated_landmarks, 'median'), [1, 3])
+    np.testing.assert_almost_equal(
+        initial_estimate(estimated_landmarks, 'trimmed', trim=0.4), [1, 3])
+    np.testing.assert_almost_equal(
+        initial_estimate(estimated_landmarks,
+                         subset=np.array([False, False, True])), [2.1, 5])
+
+    with pytest.raises(ValueError):
+        initial_estimate(estimated_landmarks, 'mode')
+
+
+def test_has_converged():
+    """Test the convergence stopping rules"""
+
+    delta = np.array([1e-5, 1e-3])
+
+    assert has_converged(delta, 1e-4, 'any')
+    assert not has_converged(delta, 1e-4, 'all')
+    assert not has_converged(delta, 1e-4, 'norm')
+    assert has_converged(delta, 1e-2, 'norm')
+
+    with pytest.raises(ValueError):
+        has_converged(delta, 1e-4, 'some')
+
+    deltas = np.array([[1e-5, 1e-3], [1e-5, 1e-5], [1e-3, 1e-3]])
+
+    np.testing.assert_equal(has_converged(deltas, 1e-4, 'any', axis=-1),
+                            [True, True, False])
+    np.testing.assert_equal(has_converged(deltas, 1e-4, 'all', axis=-1),
+                            [False, True, False])
+    np.testing.assert_equal(
+        has_converged(deltas, np.array([1e-2, 1e-4, 1e-4]), 'norm', axis=-1),
+        [True, True, False])
+
+
+def test_converge_full_output():
+    """Test reporting the iterations used to converge"""
+
+    rng = np.random.RandomState(0)
+    estimated_landmarks = rng.randn(6, 4, 2) + np.array([10, 12])
+
+    result = converge_mean(estimated_landmarks, full_output=True)
+
+    assert result.converged
+    assert 1 < result.iterations < 20
+    assert np.all(result.delta < 1e-4)
+
+    global_mean, precision = converge_mean(estimated_landmarks)
+    np.testing.assert_equal(result.mean, global_mean)
+
+    result = converge_mean(estimated_landmarks, iterations=1, full_output=True)
+
+    assert not result.converged
+    assert result.iterations == 1
+
+
+def test_converge_batch():
+    """Test converging a stack of problems at once"""
+
+    rng = np.random.RandomState(1)
+    problems = [
+        rng.randn(num, 3, 2) * rng.uniform(0.5, 3, size=(num, 1, 1)) + 5
+        for num in [4, 6, 2, 1]
+    ]
+
+    landmarks, mask = stack_problems(problems)
+    assert landmarks.shape == (4, 6, 3, 2)
+    assert mask.sum(axis=1).tolist() == [4, 6, 2, 1]
+
+    result = converge_mean_batch(landmarks, mask)
+
+    for idx, problem in enumerate(problems):
+        expected = converge_mean(problem, full_output=True)
+
+        np.testing.assert_allclose(result.mean[idx], expected.mean)
+        np.testing.assert_allclose(result.precision[idx, :len(problem)],
+                                   expected.precision)
+        assert result.iterations[idx] == expected.iterations
+
+    result = converge_mean_batch(landmarks.astype(np.float32) + 600,
+                                 mask,
+                                 tol=1e-6)
+    assert result.converged[:3].all()
+
+    selected = converge_select_batch(landmarks, mask)
+    assert selected.steps.tolist() == [3, 5, 1, 0]
+
+    for idx, problem in enumerate(problems[:3]):
+        mean = initial_estimate(problem)
+        active = np.arange(len(problem))
+
+        for step in range(len(problem) - 1):
+            expected = converge_mean(problem[active], initial_mean=mean)
+            mean = expected[0]
+            inc, exc = find_worst_partition(expected[1])
+
+            np.testing.assert_allclose(selected.means[idx, step], mean)
+            assert selected.eliminated[idx, step] == active[exc[0]]
+            active = active[inc]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test progress module
+
+"""
+__author__ = 'Ben Johnston'
+
+import pytest
+
+from johnstondechazal.data import load_all_landmarks
+from johnstondechazal.progress import Cancelled, CancellationToken, Progress
+
+
+def test_progress_callback():
+    """Test reporting progress"""
+
+    reports = []
+
+    with Progress(3, lambda done, total: reports.append((done, total))) as p:
+        for _ in range(3):
+            p.check()
+            p.update()
+
+    assert reports == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_progress_cancel():
+    """Test cancelling a job"""
+
+    cancel = CancellationToken()
+    prog = Progress(3, cancel=cancel)
+
+    prog.check()
+    cancel.cancel()
+
+    with pytest.raises(Cancelled) as err:
+        prog.check(['done'])
+
+    assert err.value.partial == ['done']
+
+
+def test_load_all_landmarks_cancel(corpus_dir):
+    """Test cancelling loading the landmarks"""
+
+    cancel = CancellationToken()
+    reports = []
+
+    def _progress(done, total):
+        reports.append(done)
+        if done == 2:
+            cancel.cancel()
+
+    with pytest.raises(Cancelled) as err:
+        load_all_landmarks(dirpath=corpus_dir,
+                           progress=_progress,
+                           cancel=cancel)
+
+    assert reports == [1, 2]
+    assert len(err.value.partial) == 2
+
+
+def test_progress_set_total():
+    """Test setting the total once it is known"""
+
+    reports = []
+
+    with Progress(progress=lambda done, total: reports.append(total)) as p:
+        p.update()
+        p.set_total(3)
+        p.update()
+
+    assert reports == [None, 3]
+
+    with Progress(progress=True) as p:
+        p.set_total(3)
+        assert p._bar.total == 3
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test server module
+
+"""
+__author__ = 'Ben Johnston'
+
+import http.client
+import json
+import os
+import socket
+import threading
+from tempfile import mkdtemp
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.server import make_server
+
+
+@pytest.fixture
+def server(corpus_dir):
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    server = make_server(gt, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path):
+    host, port = server.server_address
+    with urlopen(f'http://{host}:{port}{path}') as response:
+        return json.loads(response.read())
+
+
+def test_query(server):
+    """Test querying the ground truth of a landmark"""
+
+    result = _get(server,
+                  '/groundtruth?image=indoor_006.png&landmark=2&type=worker')
+
+    gt = FindGrouthTruth(server.RequestHandlerClass.service.gt.data_dir,
+                         download=False)
+    landmarks, meta = gt.load_landmarks_image('indoor_006.png', 'worker')
+    history = gt.converge_select(landmarks[:, :, 1], meta)
+
+    np.testing.assert_allclose(result['loc'], history.loc)
+    assert sorted(result['elimination_order']) == ['A1', 'A2', 'A3']
+
+    # The repeated query is answered from the cache
+    assert _get(
+        server,
+        '/groundtruth?image=indoor_006.png&landmark=2&type=worker') == result
+    assert server.RequestHandlerClass.service.gt.cache.hits == 1
+
+
+def test_query_errors(server):
+    """Test rejecting invalid queries"""
+
+    assert _get(server, '/images') == {
+        'images': ['indoor_006.png', 'outdoor_012.png']
+    }
+
+    for path in [
+            '/groundtruth?image=indoor_006.png',
+            '/groundtruth?image=indoor_006.png&landmark=7',
+            '/groundtruth?image=missing.png&landmark=1',
+    ]:
+        with pytest.raises(HTTPError) as err:
+            _get(server, path)
+        assert err.value.code == 400
+
+
+def test_query_failure(server):
+    """Test answering an unexpected error with a JSON body"""
+
+    service = server.RequestHandlerClass.service
+    with patch.object(service, 'query', side_effect=RuntimeError('boom')):
+        with pytest.raises(HTTPError) as err:
+            _get(server, '/groundtruth?image=indoor_006.png&landmark=1')
+
+    assert err.value.code == 500
+    assert json.loads(err.value.read()) == {'error': 'RuntimeError: boom'}
+
+    # The server keeps answering queries
+    assert _get(server, '/health') == {'status': 'ok'}
+
+
+def test_unix_socket(corpus_dir):
+    """Test serving on a Unix socket"""
+
+    path = os.path.join(mkdtemp(), 'gt.sock')
+    server = make_server(FindGrouthTruth(corpus_dir, download=False),
+                         unix_socket=path,
+                         quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    conn = http.client.HTTPConnection('localhost')
+    conn.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.sock.connect(path)
+    conn.request('GET', '/groundtruth?image=outdoor_012.png&landmark=1')
+    result = json.loads(conn.getresponse().read())
+
+    server.shutdown()
+    server.server_close()
+
+    assert result['image'] == 'outdoor_012.png'
+    assert len(result['elimination_order']) == 5
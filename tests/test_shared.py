@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test shared module
+
+"""
+__author__ = 'Ben Johnston'
+
+import numpy as np
+
+from johnstondechazal.data import dataframe_to_numpy, load_all_landmarks
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.shared import (SharedCorpus, converge_images,
+                                     corpus_tensor)
+
+
+def test_corpus_tensor(corpus_dir):
+    """Test converting the corpus to a tensor"""
+
+    df = load_all_landmarks(dirpath=corpus_dir)
+    tensor, meta, images = corpus_tensor(df)
+
+    assert tensor.shape == (2, 5, 2, 3, 2)
+    assert images == ['indoor_006.png', 'outdoor_012.png']
+
+    with SharedCorpus.publish(tensor, meta, images) as corpus:
+        attached = SharedCorpus.attach(corpus.spec)
+        landmarks, attached_meta = attached.image('outdoor_012.png', 'worker')
+
+        expected, expected_meta = dataframe_to_numpy(
+            df.loc[(df.filename == 'outdoor_012.png') & (df.type == 'worker')])
+        np.testing.assert_equal(landmarks, expected)
+        assert list(attached_meta.workerid) == list(expected_meta.workerid)
+
+        # The attached tensor is a view of the published tensor
+        corpus.tensor[1, 0] = -1
+        assert (attached.image(1)[0][0] == -1).all()
+        attached.close()
+
+
+def test_converge_images(corpus_dir):
+    """Test converging the images in worker processes"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    results = converge_images(gt, type='expert', processes=2)
+    expected = gt.converge_images(type='expert')
+
+    assert list(results) == list(expected)
+    for image, hists in results.items():
+        for hist, expected_hist in zip(hists, expected[image]):
+            np.testing.assert_allclose(hist.locs, expected_hist.locs)
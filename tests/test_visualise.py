@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Test visualise module
+
+"""
+__author__ = 'Ben Johnston'
+
+import os
+from tempfile import mkdtemp
+
+import numpy as np
+from imageio import imread, imwrite
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from johnstondechazal.groundtruth import FindGrouthTruth
+from johnstondechazal.visualise import plot_histories, render_overlays
+
+
+def test_render_overlays(corpus_dir):
+    """Test rendering the ground truth overlays"""
+
+    image_dir = mkdtemp()
+    output_dir = os.path.join(mkdtemp(), 'overlays')
+
+    imwrite(os.path.join(image_dir, 'indoor_006.png'),
+            np.zeros((76, 102, 3), dtype=np.uint8))
+
+    paths = render_overlays(output_dir,
+                            data_dir=corpus_dir,
+                            image_dir=image_dir,
+                            processes=1)
+
+    assert paths == [os.path.join(output_dir, 'indoor_006.png')]
+    assert imread(paths[0]).shape[:2] == (76, 102)
+
+
+def test_plot_histories(corpus_dir):
+    """Test plotting the paths of the histories as one line collection"""
+
+    gt = FindGrouthTruth(corpus_dir, download=False)
+    hists = gt.converge_image('indoor_006.png')
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    artists = plot_histories(hists, ax)
+
+    lines = [x for x in ax.collections if isinstance(x, LineCollection)]
+    assert len(lines) == 1
+    assert len(lines[0].get_segments()) == sum(
+        len(hist.locs) - 1 for hist in hists)
+
+    global_means, final_locs = artists[1:]
+    np.testing.assert_equal(global_means.get_offsets(),
+                            [hist.locs[0] for hist in hists])
+    np.testing.assert_equal(final_locs.get_offsets(),
+                            [hist.loc for hist in hists])
+
+    fig.canvas.draw()